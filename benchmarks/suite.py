@@ -0,0 +1,507 @@
+"""Benchmark suite of the compile hot paths with JSON output
+
+Run with ``python benchmarks/suite.py [-o result.json] [-k name] [-r repeat] [--compare baseline.json]``.
+Each benchmark builds its input once for each parameter and returns a function timed ``repeat`` times,
+where the minimum and the median wall time are reported.
+A timed function may set the attribute ``metrics`` to a dict of other measures (e.g. the peak memory),
+which is reported with the times, and ``close`` to a function releasing its resources (e.g. a process pool).
+The result is written as JSON together with the versions and the machine,
+and ``--compare`` prints the ratio to a previous result, exiting with a non-zero status
+when a benchmark is slower than ``--threshold`` times the baseline.
+The suite also exits with a non-zero status when the import of a module in import_time
+takes longer than ``--import-budget`` seconds or imports one of the heavy optional modules eagerly.
+
+The circuits are built on the backend of util/test_backend (3 qubits)
+and on synthetic PortTable topologies with the same gate definitions.
+"""
+import argparse
+import datetime
+import random
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.iq_port import IQPort
+from sequence_parser.variable import Variable, Variables
+from sequence_parser.backend import PortTable, GateTable, Backend
+from sequence_parser.circuit import Circuit
+from sequence_parser.executor import CompileExecutor
+from sequence_parser.filter import FIRFilter, IIRFilter
+from sequence_parser.util.topological_sort import weighted_topological_sort
+from sequence_parser.instruction import Gaussian, Deriviative, FlatTop, RaisedCos, Delay, Acquire
+
+BENCHMARK_LIST = []
+
+def benchmark(*param_list):
+    """Register the benchmark function (param) -> function to be timed"""
+    def register(function):
+        BENCHMARK_LIST.append((function.__name__, function, param_list))
+        return function
+    return register
+
+def build_backend(nodes, edges):
+    """Backend of a synthetic topology with the gates of util/test_backend
+    Args:
+        nodes (list): qubit indices
+        edges (list): coupled pairs (control, target)
+    """
+    port_table = PortTable()
+    port_table._add_nodes(nodes)
+    port_table._add_edges(edges)
+
+    gate_table = GateTable()
+    for node, qubit in port_table.nodes.items():
+        rx90 = Sequence()
+        with rx90.align(qubit.q, mode="left"):
+            rx90.add(Gaussian(amplitude=0.5, fwhm=3, duration=10), qubit.q)
+            rx90.add(Deriviative(Gaussian(amplitude=0.3j, fwhm=3, duration=10)), qubit.q)
+        gate_table._add_gate("rx90", node, rx90)
+
+        meas = Sequence()
+        with meas.align(qubit.r, mode="left"):
+            meas.add(FlatTop(RaisedCos(amplitude=0.2, duration=10), top_duration=100), qubit.r)
+            with meas.align(qubit.r, mode="sequential"):
+                meas.add(Delay(10), qubit.r)
+                meas.add(Acquire(duration=80), qubit.r)
+        gate_table._add_gate("meas", node, meas)
+
+    for edge, port in port_table.edges.items():
+        rzx45 = Sequence()
+        rzx45.add(FlatTop(RaisedCos(amplitude=0.1, duration=10), top_duration=50), port_table.nodes[edge[1]].q)
+        rzx45.add(FlatTop(RaisedCos(amplitude=0.8*np.exp(0.125j*np.pi), duration=10), top_duration=50), port)
+        gate_table._add_gate("rzx45", edge, rzx45)
+
+    backend = Backend()
+    backend.add_port_table(port_table)
+    backend.add_gate_table(gate_table)
+    return backend
+
+def get_backend(topology):
+    """Args:
+        topology (str): "test" for util/test_backend, "chain<n>" or "grid<n>" for n x n qubits
+    """
+    if topology == "test":
+        from sequence_parser.util.test_backend import backend
+        return backend
+    if topology.startswith("chain"):
+        n_qubits = int(topology[len("chain"):])
+        return build_backend(list(range(n_qubits)), [(node, node + 1) for node in range(n_qubits - 1)])
+    if topology.startswith("grid"):
+        n = int(topology[len("grid"):])
+        nodes = list(range(n*n))
+        edges = [(row*n + col, row*n + col + 1) for row in range(n) for col in range(n - 1)]
+        edges += [(row*n + col, (row + 1)*n + col) for row in range(n - 1) for col in range(n)]
+        return build_backend(nodes, edges)
+    raise ValueError(f"unknown topology {topology}")
+
+def build_rb_circuit(backend, depth, seed=0):
+    """Circuit of random Clifford layers followed by the readout
+
+    A single-qubit Clifford is written as rz(a) rx90 rz(b) rx90 rz(c) with multiples of pi/2,
+    and the cnot is applied on every other edge alternately.
+    """
+    rng = np.random.default_rng(seed)
+    node_list = list(backend.port_table.nodes.keys())
+    edge_list = list(backend.port_table.edges.keys())
+    cir = Circuit(backend)
+    for layer in range(depth):
+        for node in node_list:
+            angle = 0.5*np.pi*rng.integers(4, size=3)
+            cir.rz(angle[0], node)
+            cir.rx90(node)
+            cir.rz(angle[1], node)
+            cir.rx90(node)
+            cir.rz(angle[2], node)
+        for control, target in edge_list[layer % 2::2]:
+            cir.cnot(control, target)
+        cir.qtrigger(node_list)
+    cir.measurement_all()
+    return cir
+
+@benchmark(1000, 10000, 100000, 1000000)
+def single_pulse(n_samples):
+    """Render a single Gaussian pulse over n_samples samples"""
+    port = Port("Q0", if_freq=0.1)
+    seq = Sequence()
+    seq.add(Gaussian(amplitude=0.5, fwhm=n_samples/4, duration=n_samples), port)
+    def run():
+        seq.reset_compile()
+        seq.compile()
+    return run
+
+@benchmark(10, 100, 1000)
+def triggers(n_triggers):
+    """Compile 4 ports synchronized by n_triggers triggers on alternating pairs of ports"""
+    port_list = [Port(f"Q{index}", if_freq=0.1) for index in range(4)]
+    seq = Sequence()
+    for index in range(n_triggers):
+        pair = port_list[index % 3:index % 3 + 2]
+        for offset, port in enumerate(pair):
+            seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=20 + 10*offset), port)
+        seq.trigger(pair if index % 2 else port_list)
+    def run():
+        seq.reset_compile()
+        seq.compile()
+    return run
+
+@benchmark(("test", 10), ("test", 100), ("test", 1000), ("chain16", 100), ("grid4", 100))
+def rb_build(param):
+    """Construct an RB circuit of the depth on the topology"""
+    topology, depth = param
+    backend = get_backend(topology)
+    return lambda: build_rb_circuit(backend, depth)
+
+@benchmark(("test", 10), ("test", 100), ("test", 1000), ("chain16", 100), ("grid4", 100))
+def rb_compile(param):
+    """Compile an RB circuit of the depth on the topology"""
+    topology, depth = param
+    cir = build_rb_circuit(get_backend(topology), depth)
+    def run():
+        cir.reset_compile()
+        cir.compile()
+    return run
+
+@benchmark((1000,), (100, 100), (50, 50, 50))
+def variables_compile(shape):
+    """Compile a grid of variables and walk through the update commands, which are evaluated lazily"""
+    variables = Variables()
+    for axis, size in enumerate(shape):
+        variables.add(Variable(f"x{axis}", np.linspace(0, 1, size), "au"))
+    def run():
+        variables.compile()
+        for _ in variables.update_command_list:
+            pass
+    return run
+
+@benchmark("raster", "snake", "gray")
+def sweep_order(order):
+    """Compile a 4-port sweep of 20 amplitudes x 10 delays, where the delay is swept outermost in the snake and gray orders"""
+    port_list = [Port(f"Q{index}", if_freq=0.1) for index in range(4)]
+    amplitude = Variable("amplitude", np.linspace(0, 1, 20), "")
+    delay = Variable("delay", np.arange(10)*10, "ns")
+    seq = Sequence()
+    for _ in range(10):
+        for port in port_list:
+            seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=40), port)
+        seq.add(Delay(delay), port_list[0])
+        seq.add(Gaussian(amplitude=amplitude, fwhm=10, duration=40), port_list[1])
+        seq.trigger(port_list)
+    variables = Variables()
+    variables.add(delay)
+    variables.add(amplitude)
+    if order == "raster":
+        # the canonical order with the duration-changing delay innermost
+        variables.compile(order, outer=["amplitude"])
+    else:
+        variables.compile(order, outer=seq.get_duration_variable_names())
+    return lambda: seq.compile_sweep(variables)
+
+@benchmark(("miss", 100), ("hit", 100), ("miss", 1000), ("hit", 1000))
+def waveform_information(param):
+    """Get the waveform information of an RB circuit of the depth on util/test_backend, compiled every time or found in the compile cache"""
+    mode, depth = param
+    cir = build_rb_circuit(get_backend("test"), depth)
+    return lambda: cir.get_waveform_information(dtype=np.int16, cache=(mode == "hit"))
+
+@benchmark(10, 100, 1000)
+def dump_load(depth):
+    """Dump and load the setting of an RB circuit of the depth on util/test_backend"""
+    backend = get_backend("test")
+    cir = build_rb_circuit(backend, depth)
+    def run():
+        new_cir = Circuit(backend)
+        new_cir.load_setting(cir.dump_setting())
+    return run
+
+def i_factor(if_freq):
+    return 1 + 0.1*if_freq
+
+def q_delay(if_freq):
+    return 0.3 - if_freq
+
+@benchmark(("Port", 500), ("IQPort", 500), ("Port", 2000), ("IQPort", 2000), ("Port", 8000), ("IQPort", 8000))
+def iq_port(param):
+    """Render n_pulses pulses on an IQPort with frequency-dependent compensations, or on a Port for reference"""
+    port_class, n_pulses = param
+    if port_class == "IQPort":
+        port = IQPort("Q0", if_freq=0.1)
+        port.set_i_factor(i_factor)
+        port.set_q_delay(q_delay)
+    else:
+        port = Port("Q0", if_freq=0.1)
+    seq = Sequence()
+    for _ in range(n_pulses):
+        seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=40), port)
+        seq.add(Deriviative(Gaussian(amplitude=0.1j, fwhm=10, duration=40)), port)
+        seq.add(Delay(120), port)
+    def run():
+        seq.reset_compile()
+        seq.compile()
+    return run
+
+@benchmark(250, 1000, 4000)
+def pulse_write(n_pulses):
+    """Render n_pulses pulses on a single port, whose time per pulse stays flat when the rendering is linear"""
+    port = Port("Q0")
+    seq = Sequence()
+    for _ in range(n_pulses):
+        seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=40), port)
+        seq.add(Delay(160), port)
+    def run():
+        seq.reset_compile()
+        seq.compile()
+    return run
+
+@benchmark(1000, 4000, 16000)
+def iter_waveform(n_pulses):
+    """Get the first chunk of 2**16 samples from 2 ports of n_pulses pulses, which is set by the scheduling rather than by the rendering"""
+    seq = Sequence()
+    for name in ["Q0", "Q1"]:
+        port = Port(name)
+        for _ in range(n_pulses):
+            seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=40), port)
+            seq.add(Delay(960), port)
+    def run():
+        seq.reset_compile()
+        next(seq.iter_waveform(2**16))
+    return run
+
+def bias_tee(time_constant=20000):
+    """First-order high-pass compensation of a bias tee, y[n] = y[n-1] + x[n] - r*x[n-1] with r = exp(-1/time_constant)"""
+    decay = np.exp(-1/time_constant)
+    return IIRFilter([1, -decay], [1, -1], tail=0)
+
+def cable(n_taps):
+    """Exponential impulse response of a cable normalized to the unit DC gain"""
+    taps = np.exp(-np.arange(n_taps)/(n_taps/5))
+    return FIRFilter(taps/np.sum(taps))
+
+FILTER_DICT = {
+    "none" : lambda: [],
+    "fir64" : lambda: [cable(64)],
+    "fir1024" : lambda: [cable(1024)],
+    "iir_bias_tee" : lambda: [bias_tee()],
+    "iir4" : lambda: [IIRFilter([0.2, 0.1, 0.05, 0.02, 0.01], [1, -0.5, 0.2, -0.1, 0.05], tail=200)],
+    "iir_bias_tee+fir256" : lambda: [bias_tee(), cable(256)],
+}
+
+@benchmark(*FILTER_DICT)
+def filters(label):
+    """Compile a 1M-sample waveform through the predistortion filters, compared with "none" """
+    port = Port("Q0", if_freq=0.1)
+    for tmp in FILTER_DICT[label]():
+        port.add_filter(tmp)
+    seq = Sequence()
+    # 200 ns per pulse at DAC_STEP = 1 ns, and the waveform is extended by the tail of the filters
+    for _ in range(int(10**6 - port._get_filter_tail())//200):
+        seq.add(Gaussian(amplitude=0.1, fwhm=10, duration=40), port)
+        seq.add(Delay(160), port)
+    def run():
+        seq.reset_compile()
+        seq.compile()
+    return run
+
+@benchmark(100, 1000, 10000, 100000)
+def topological_sort(n_triggers):
+    """Schedule a graph of 20 ports chaining their triggers, each trigger shared by 3 randomly chosen ports"""
+    n_ports, ports_per_trigger = 20, 3
+    rng = random.Random(0)
+    last_trigger = [0]*n_ports
+    weighted_edge_dict = {}
+    for trigger_index in range(1, n_triggers):
+        if trigger_index == n_triggers - 1:
+            port_index_list = range(n_ports)
+        else:
+            port_index_list = rng.sample(range(n_ports), ports_per_trigger)
+        for port_index in port_index_list:
+            key = (last_trigger[port_index], trigger_index)
+            weighted_edge_dict[key] = max(weighted_edge_dict.get(key, 0), rng.uniform(10, 100))
+            last_trigger[port_index] = trigger_index
+    node_list = list(range(n_triggers))
+    weighted_edge_list = [(fnode, bnode, weight) for (fnode, bnode), weight in weighted_edge_dict.items()]
+    return lambda: weighted_topological_sort(node_list, weighted_edge_list)
+
+@benchmark(1, 2, 4, 8)
+def parallel_compile(workers):
+    """Compile an RB circuit of depth 100 on a chain of 16 qubits with the threads"""
+    cir = build_rb_circuit(get_backend("chain16"), 100)
+    def run():
+        cir.reset_compile()
+        cir.compile(workers=workers)
+    return run
+
+@benchmark(1, 2, 4, 8)
+def executor(max_workers):
+    """Compile 32 RB circuits of depth 20 on a chain of 16 qubits with the process pool, whose workers are started by the warm-up"""
+    backend = get_backend("chain16")
+    circuit_list = [build_rb_circuit(backend, 20, seed) for seed in range(32)]
+    compile_executor = CompileExecutor(backend, max_workers=max_workers)
+    run = lambda: compile_executor.compile(circuit_list)
+    run.close = compile_executor.shutdown
+    return run
+
+MEMORY_SCRIPT = """
+import sys
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.instruction import Square
+
+n_samples, out = int(sys.argv[1]), sys.argv[2] or None
+port = Port("Q0", if_freq=0.1)
+seq = Sequence()
+# the pulses cover every sample, since the pages of the zero-filled waveform are not resident until written
+for _ in range(100):
+    seq.add(Square(amplitude=0.5, duration=n_samples/100), port)
+seq.compile(out=out)
+
+status = dict(line.split(":", 1) for line in open("/proc/self/status"))
+print(int(status["VmHWM"].split()[0]), int(status["RssAnon"].split()[0]))
+"""
+
+@benchmark(("memory", 10**6), ("memmap", 10**6), ("memory", 10**7), ("memmap", 10**7), ("memory", 4*10**7), ("memmap", 4*10**7))
+def memmap(param):
+    """Compile n_samples samples in memory or into np.memmap files in a fresh interpreter,
+    whose peak and anonymous (non file-backed) resident memory in MB are reported as the metrics
+    """
+    output, n_samples = param
+    directory = tempfile.TemporaryDirectory()
+    out = directory.name if output == "memmap" else ""
+    def run():
+        stdout = subprocess.run([sys.executable, "-c", MEMORY_SCRIPT, str(n_samples), out], capture_output=True, text=True, check=True).stdout.split()
+        run.metrics = {"peak_rss_mb" : int(stdout[0])/1024, "anon_rss_mb" : int(stdout[1])/1024}
+    run.close = directory.cleanup
+    return run
+
+LAZY_MODULES = ["matplotlib", "networkx", "scipy", "cirq", "qupy"]
+DEFAULT_IMPORT_BUDGET = 0.5 # s
+
+IMPORT_SCRIPT = f"""
+import importlib, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+elapsed = time.perf_counter() - start
+loaded = [name for name in {LAZY_MODULES!r} if name in sys.modules]
+print(elapsed, ",".join(loaded))
+"""
+
+@benchmark("sequence_parser.sequence", "sequence_parser.circuit")
+def import_time(module):
+    """Start a fresh interpreter importing the module, whose own import time in ms
+    and the heavy optional modules imported eagerly are reported as the metrics
+    """
+    elapsed_list = []
+    def run():
+        stdout = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT, module], capture_output=True, text=True, check=True).stdout.split()
+        elapsed_list.append(float(stdout[0]))
+        run.metrics = {"import_ms" : 1e3*min(elapsed_list), "eager" : stdout[1].split(",") if len(stdout) > 1 else []}
+    return run
+
+def check_import_budget(result_list, budget):
+    """Print the imports slower than the budget or importing the heavy optional modules eagerly
+    Args:
+        budget (float): upper limit of the best import time in seconds
+    Returns:
+        violation_list (list): (module, import time in ms, eagerly imported modules) of the violations
+    """
+    violation_list = []
+    for result in result_list:
+        if result["name"] != "import_time":
+            continue
+        metrics = result["metrics"]
+        if metrics["import_ms"] > 1e3*budget or metrics["eager"]:
+            print(f"{result['param']} : {metrics['import_ms']:.1f} ms (budget {1e3*budget:.0f} ms), eagerly imported : {', '.join(metrics['eager']) or 'none'}")
+            violation_list.append((result["param"], metrics["import_ms"], metrics["eager"]))
+    return violation_list
+
+def get_environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "timestamp" : datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit" : commit,
+        "python" : platform.python_version(),
+        "numpy" : np.__version__,
+        "platform" : platform.platform(),
+        "processor" : platform.processor() or platform.machine(),
+        "cpu_count" : os.cpu_count(),
+    }
+
+def run_benchmarks(keyword=None, repeat=5):
+    """Returns:
+        result_list (list): {"name", "param", "min", "median", "repeat"} of each benchmark and parameter in seconds,
+            with "metrics" when the timed function sets them
+    """
+    result_list = []
+    for name, function, param_list in BENCHMARK_LIST:
+        if keyword is not None and keyword not in name:
+            continue
+        for param in param_list:
+            run = function(param)
+            try:
+                run() # warm up the caches and the lazy imports
+                elapsed = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    run()
+                    elapsed.append(time.perf_counter() - start)
+            finally:
+                if hasattr(run, "close"):
+                    run.close()
+            result = {"name" : name, "param" : param, "min" : min(elapsed), "median" : float(np.median(elapsed)), "repeat" : repeat}
+            line = f"{name}".ljust(20) + f"{param}".ljust(20) + f"{result['min']*1e3:.3f} ms".rjust(16) + f"{result['median']*1e3:.3f} ms".rjust(16)
+            if hasattr(run, "metrics"):
+                result["metrics"] = run.metrics
+                line += "  " + ", ".join(f"{key} = {value:.1f}" if isinstance(value, float) else f"{key} = {value}" for key, value in run.metrics.items())
+            print(line)
+            result_list.append(result)
+    return result_list
+
+def compare(result_list, baseline_list, threshold):
+    """Print the ratio of the minimum time to the baseline
+    Returns:
+        regression_list (list): (name, param, ratio) slower than the threshold
+    """
+    baseline_dict = {(result["name"], json.dumps(result["param"])) : result for result in baseline_list}
+    regression_list = []
+    print("name".ljust(20) + "param".ljust(20) + "ratio".rjust(10))
+    for result in result_list:
+        baseline = baseline_dict.get((result["name"], json.dumps(result["param"])))
+        if baseline is None:
+            continue
+        ratio = result["min"]/baseline["min"]
+        flag = " *" if ratio > threshold else ""
+        print(f"{result['name']}".ljust(20) + f"{result['param']}".ljust(20) + f"{ratio:.2f}".rjust(10) + flag)
+        if ratio > threshold:
+            regression_list.append((result["name"], result["param"], ratio))
+    return regression_list
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="benchmark suite of sequence_parser")
+    parser.add_argument("-o", "--output", help="path of the JSON result")
+    parser.add_argument("-k", "--keyword", help="run only the benchmarks whose name contains the keyword")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="number of timed runs of each benchmark")
+    parser.add_argument("--compare", help="path of the JSON result to be compared with")
+    parser.add_argument("--threshold", type=float, default=1.2, help="ratio to the baseline reported as a regression")
+    parser.add_argument("--import-budget", type=float, default=DEFAULT_IMPORT_BUDGET, help="upper limit of the import time in seconds")
+    args = parser.parse_args()
+
+    print("name".ljust(20) + "param".ljust(20) + "min".rjust(16) + "median".rjust(16))
+    result_list = run_benchmarks(args.keyword, args.repeat)
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump({"environment" : get_environment(), "results" : result_list}, file, indent=2)
+    failed = bool(check_import_budget(result_list, args.import_budget))
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline_list = json.load(file)["results"]
+        failed |= bool(compare(result_list, baseline_list, args.threshold))
+    if failed:
+        sys.exit(1)
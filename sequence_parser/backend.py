@@ -1,5 +1,7 @@
 from .port import Port
 from .sequence import Sequence
+from .instruction.trigger import Trigger
+from .instruction.template import Template
 
 class QubitPort:
     def __init__(self, node):
@@ -88,6 +90,7 @@ class PortTable:
 class GateTable:
     def __init__(self):
         self.gate_table = {}
+        self.template_table = {}
         
     def __repr__(self):
         print_str = ""
@@ -99,10 +102,48 @@ class GateTable:
 
     def _add_gate(self, gate_name, key, gate):
         self.gate_table[(gate_name, key)] = gate
+        self.template_table.pop((gate_name, key), None)
         
     def get_gate(self, gate_name, key):
         gate = self.gate_table[(gate_name, key)]
         return gate
+
+    def get_template(self, gate_name, key):
+        """Get the gate whose instructions between triggers are precompiled as Template on each port
+        Args:
+            gate_name (str): name of gate
+            key (int or tuple): target
+        Returns:
+            template (Sequence): sequence equivalent to the gate
+        """
+        if (gate_name, key) not in self.template_table:
+            self.template_table[(gate_name, key)] = self._compile_template(self.get_gate(gate_name, key))
+        return self.template_table[(gate_name, key)]
+
+    def _compile_template(self, gate):
+        template = Sequence()
+        block_dict = {}
+
+        def flush(port):
+            inst_list = block_dict.pop(port.name, [])
+            if Template._is_available(inst_list):
+                template.add(Template(inst_list), port, copy=False)
+            else:
+                for instruction in inst_list:
+                    template.add(instruction, port, copy=False)
+
+        port_dict = {}
+        for instruction, port in gate.instruction_list:
+            if isinstance(instruction, Trigger):
+                for tmp_port in port:
+                    flush(tmp_port)
+                template.trigger(port, align=instruction.align)
+            else:
+                port_dict[port.name] = port
+                block_dict.setdefault(port.name, []).append(instruction)
+        for port_name in list(block_dict.keys()):
+            flush(port_dict[port_name])
+        return template
     
     def dump_setting(self):
         setting = {}
@@ -112,6 +153,7 @@ class GateTable:
         
     def load_setting(self, setting):
         self.gate_table = {}
+        self.template_table = {}
         for (gate_name, key), tmp_setting in setting.items():
             gate = Sequence()
             gate.load_setting(tmp_setting)
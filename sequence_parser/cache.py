@@ -0,0 +1,249 @@
+import functools
+import hashlib
+import pickle
+from collections import OrderedDict
+import numpy as np
+from .variable import Variable, Expression
+from .instruction.instruction import Instruction
+
+DEFAULT_MAX_BYTES = 256*2**20
+
+class _Uncacheable(Exception):
+    pass
+
+_PRIMITIVE_TYPE_SET = {type(None), bool, int, float, complex, str, bytes}
+_SCALAR_TYPE_SET = _PRIMITIVE_TYPE_SET | {np.float64, np.complex128, np.int64}
+
+def _get_digest(token):
+    return hashlib.blake2b(pickle.dumps(token, protocol=pickle.HIGHEST_PROTOCOL), digest_size=20).digest()
+
+@functools.lru_cache(maxsize=4096)
+def _get_leaf_digest(cls, param_items):
+    """Digest of an instruction without children whose parameters are all scalars,
+    shared by the instructions created on the spot with the same parameters (e.g. VirtualZ and Trigger)
+    """
+    return _get_digest((cls.__module__, cls.__qualname__, dict(param_items), None))
+
+def _get_token(obj, memo):
+    """Convert the object into a picklable structure of the values which determine the compiled waveform
+
+    The instructions are converted by their params, their insts and the settings given by _get_extra_params.
+    The variables are converted by their names and value arrays, and their values at the current sweep point
+    are added separately by _FingerprintState.get_fingerprint, so that the token of an instruction does not change during a sweep
+    and is memoized on the instruction as _fingerprint. The instructions must not be modified after being added to a sequence.
+
+    Args:
+        obj: instruction, variable, port, parameter, or a container of them
+        memo (dict): {id : token} of the ports and the variables already converted
+    """
+    cls = type(obj)
+    if cls in _PRIMITIVE_TYPE_SET:
+        return obj
+    if isinstance(obj, Instruction):
+        digest = obj.__dict__.get("_fingerprint")
+        if digest is not None:
+            return digest
+        extra_params = obj._get_extra_params()
+        if not obj.insts and not extra_params and all(type(value) in _SCALAR_TYPE_SET for value in obj.params.values()):
+            digest = obj._fingerprint = _get_leaf_digest(cls, tuple(obj.params.items()))
+            return digest
+        params = {key : value if type(value) in _PRIMITIVE_TYPE_SET else _get_token(value, memo) for key, value in obj.params.items()}
+        insts = [_get_token(inst, memo) for inst in obj.insts.values()] if obj.insts else None
+        token = (cls.__module__, cls.__qualname__, params, insts)
+        if extra_params:
+            token += (_get_token(extra_params, memo),)
+        digest = obj._fingerprint = _get_digest(token)
+        return digest
+    token = memo.get(id(obj))
+    if token is not None:
+        return token
+    if isinstance(obj, Expression):
+        token = memo[id(obj)] = ("Expression", obj.function, [_get_token(operand, memo) for operand in obj.operand_list])
+        return token
+    if isinstance(obj, Variable):
+        token = memo[id(obj)] = ("Variable", obj.name, _get_token(obj.value_array, memo))
+        return token
+    if isinstance(obj, (bool, int, float, complex, str, bytes)):
+        return obj
+    if isinstance(obj, np.generic):
+        return ("generic", obj.dtype.str, obj.tobytes())
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.hasobject:
+            return ("list", [_get_token(value, memo) for value in obj.ravel()], obj.shape)
+        return ("ndarray", obj.dtype.str, obj.shape, obj.tobytes())
+    if isinstance(obj, np.polynomial.polynomial.ABCPolyBase):
+        return (cls.__qualname__, _get_token(obj.coef, memo), _get_token(obj.domain, memo), _get_token(obj.window, memo))
+    if isinstance(obj, (list, tuple)):
+        return (type(obj).__name__, [_get_token(value, memo) for value in obj])
+    if isinstance(obj, dict):
+        return ("dict", [(_get_token(key, memo), _get_token(value, memo)) for key, value in obj.items()])
+    if hasattr(obj, "_get_config"):
+        # the settings of Port and Filter, excluding the compiled state and the caches
+        token = memo[id(obj)] = (cls.__module__, cls.__qualname__, _get_token(obj._get_config(), memo))
+        return token
+    if cls.__module__.startswith("sequence_parser."):
+        return (cls.__qualname__, _get_token(vars(obj), memo))
+    # e.g. user-defined functions, whose behavior cannot be compared
+    raise _Uncacheable()
+
+class _FingerprintState:
+    """Running digest of the instruction list of a sequence
+
+    The instruction list only grows by appending, so that only the instructions added since the last call are hashed,
+    and the digest of an instruction shared by many sequences (e.g. a gate) is computed once.
+    The state is not pickled and starts over in the copy.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def __getstate__(self):
+        return {}
+
+    def __setstate__(self, state):
+        self._reset()
+
+    def _reset(self, instruction_list=None):
+        self.instruction_list = instruction_list
+        self.count = 0
+        self.hasher = hashlib.blake2b(digest_size=20)
+        self.cacheable = True
+
+    def _update(self, instruction_list):
+        """Hash the instructions appended since the last call
+        Args:
+            instruction_list (list): list of (instruction, port or list of ports) of the sequence
+        """
+        if instruction_list is not self.instruction_list or len(instruction_list) < self.count:
+            self._reset(instruction_list)
+        if not self.cacheable:
+            return
+        memo = {}
+        port_memo = {} # {id of the port or the list of ports : encoded names}
+        for instruction, port in instruction_list[self.count:]:
+            try:
+                digest = instruction.__dict__.get("_fingerprint") or _get_token(instruction, memo)
+            except _Uncacheable:
+                self.cacheable = False
+                return
+            port_bytes = port_memo.get(id(port))
+            if port_bytes is None:
+                port_name_list = [tmp.name for tmp in port] if isinstance(port, (list, tuple)) else [port.name]
+                port_bytes = port_memo[id(port)] = pickle.dumps(port_name_list, protocol=pickle.HIGHEST_PROTOCOL)
+            # the digests have a fixed length, so that the concatenation is unambiguous
+            self.hasher.update(digest)
+            self.hasher.update(port_bytes)
+        self.count = len(instruction_list)
+
+    def get_fingerprint(self, instruction_list, variable_dict, *obj_list):
+        """Fingerprint of the instructions, the variable values at the current sweep point and the other objects
+        Args:
+            instruction_list (list): list of (instruction, port or list of ports) of the sequence
+            variable_dict (dict): {variable_name : list of the Variables} of the sequence
+            obj_list: e.g. the ports and the output format
+        Returns:
+            fingerprint (bytes): digest of the sequence, or None if some of the objects cannot be fingerprinted
+        """
+        self._update(instruction_list)
+        if not self.cacheable:
+            return None
+        memo = {}
+        try:
+            value_token = [(name, [_get_token(variable.value, memo) for variable in variable_list]) for name, variable_list in variable_dict.items()]
+            token = _get_token(obj_list, memo)
+        except (AttributeError, _Uncacheable):
+            # the variables not updated yet, or e.g. a user-defined function in the ports
+            return None
+        hasher = self.hasher.copy()
+        hasher.update(pickle.dumps((value_token, token), protocol=pickle.HIGHEST_PROTOCOL))
+        return hasher.digest()
+
+def _get_nbytes(obj):
+    """Total size of the arrays in the nested output"""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(_get_nbytes(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(_get_nbytes(value) for value in obj)
+    return 0
+
+def _copy_arrays(obj):
+    """Copy the arrays in the nested output, which may be views of the ports or of the caller's buffers"""
+    if isinstance(obj, np.ndarray):
+        return np.array(obj, copy=True)
+    if isinstance(obj, dict):
+        return {key : _copy_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_copy_arrays(value) for value in obj)
+    return obj
+
+class CompileCache:
+    """In-memory LRU cache of the compiled outputs keyed on the fingerprint of the sequence
+
+    The least recently used outputs are evicted when the arrays in the cache exceed max_bytes.
+    The arrays are copied when stored and when returned, so that the callers own the returned arrays
+    and the cache is not changed by the buffers written in place (e.g. np.memmap) or reused by the callers.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            max_bytes (int): upper limit of the total size of the cached arrays
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.entry_dict = OrderedDict() # {fingerprint : (output, nbytes)}
+
+    def __len__(self):
+        return len(self.entry_dict)
+
+    def __repr__(self):
+        return f"CompileCache ({len(self)} entries, {self.nbytes}/{self.max_bytes} bytes, {self.hits} hits, {self.misses} misses)"
+
+    def get(self, fingerprint):
+        """Returns:
+            output: cached output, or None if not cached
+        """
+        entry = self.entry_dict.get(fingerprint)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entry_dict.move_to_end(fingerprint)
+        self.hits += 1
+        return _copy_arrays(entry[0])
+
+    def put(self, fingerprint, output):
+        """Store the output, which is not cached if larger than max_bytes
+        Args:
+            fingerprint (bytes): key given by _FingerprintState.get_fingerprint
+            output: nested dict and list of the arrays
+        """
+        nbytes = _get_nbytes(output)
+        if nbytes > self.max_bytes:
+            return
+        if fingerprint in self.entry_dict:
+            self.nbytes -= self.entry_dict.pop(fingerprint)[1]
+        self.entry_dict[fingerprint] = (_copy_arrays(output), nbytes)
+        self.nbytes += nbytes
+        self.set_max_bytes(self.max_bytes)
+
+    def set_max_bytes(self, max_bytes):
+        """Change the upper limit, evicting the least recently used outputs
+        Args:
+            max_bytes (int): upper limit of the total size of the cached arrays
+        """
+        self.max_bytes = max_bytes
+        while self.nbytes > self.max_bytes:
+            _, (_, nbytes) = self.entry_dict.popitem(last=False)
+            self.nbytes -= nbytes
+
+    def clear(self):
+        self.entry_dict.clear()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+compile_cache = CompileCache()
@@ -1,19 +1,24 @@
 import itertools
 import numpy as np
-import matplotlib.pyplot as plt
-from .sequence import Sequence
+from .sequence import Sequence, _verify_output_format
 from .instruction.instruction_parser import compose
 from .instruction.command import VirtualZ, Delay
 from .instruction.acquire import Acquire
 from .instruction.align import _AlignManager
-from .util.decompose import matrix_to_su2, matrix_to_su4
+from .instruction.detuning import _DetuningManager
 from sequence_parser.instruction import acquire
 from .sequence import sequencer_rc_context
 
 class CircuitBase(Sequence):
-    def __init__(self, backend):
+    def __init__(self, backend, use_template=False):
+        """
+        Args:
+            backend (Backend): port table and gate table
+            use_template (bool): stamp the gates precompiled by GateTable.get_template instead of expanding them
+        """
         super().__init__()
         self.backend = backend
+        self.use_template = use_template
         self._apply_port_table(backend.port_table)
         self._apply_gate_table(backend.gate_table)
             
@@ -135,8 +140,11 @@ class CircuitBase(Sequence):
             key (str): name of gate
             index (int or list): target
         """
-        gate = self.gate_table.get_gate(key, index)
-        self.call(gate)
+        if self.use_template:
+            gate = self.gate_table.get_template(key, index)
+        else:
+            gate = self.gate_table.get_gate(key, index)
+        self.call(gate, copy=False)
         
     def qdelay(self, time, target):
         """Execute a delay with given angle
@@ -144,7 +152,7 @@ class CircuitBase(Sequence):
             time (float) : wait time [ns]
             target (int): index of the target qubit port
         """
-        self.add(Delay(time), self.port_table.nodes[target].q)
+        self.add(Delay(time), self.port_table.nodes[target].q, copy=False)
 
     def rz(self, phi, target):
         """Execute a rz gate with given angle
@@ -152,9 +160,9 @@ class CircuitBase(Sequence):
             phi (float) : rotation angle [0, 2pi]
             target (int): index of the target qubit port
         """
-        self.add(VirtualZ(phi), self.port_table.nodes[target].q)
+        self.add(VirtualZ(phi), self.port_table.nodes[target].q, copy=False)
         for cross in self.port_table.syncs[target]:
-            self.add(VirtualZ(phi), cross)
+            self.add(VirtualZ(phi), cross, copy=False)
 
     def rx90(self, target):
         """Execute a rx90 gate
@@ -206,7 +214,8 @@ class CircuitBase(Sequence):
             time_range (tupple): time_range for plot written as (start, end)
             baseband (bool): whether to plot at baseband or at port.if_freq
         """
-        
+        import matplotlib.pyplot as plt
+
         if reflect_skew is False:
             skew_list = []
             all_ports = list(self.q.values()) + list(self.r.values()) + list(self.a.values()) + list(self.i.values()) + list(self.c.values())
@@ -251,10 +260,7 @@ class CircuitBase(Sequence):
                 plt.axhline(0, color="black", linestyle="-")
                 for measurement_window in port.measurement_windows:
                     plt.axvspan(measurement_window[0], measurement_window[1], color="green", alpha=0.3)
-                if baseband:
-                    plot_waveform = np.exp(-1j*(2*np.pi*port.if_freq*port.time))*port.waveform
-                else:
-                    plot_waveform = port.waveform
+                plot_waveform = port._get_waveform(baseband)
                 plt.step(port.time, plot_waveform.real)
                 plt.step(port.time, plot_waveform.imag)
                 plt.fill_between(port.time, plot_waveform.real, step="pre", alpha=0.4)
@@ -285,10 +291,36 @@ class CircuitBase(Sequence):
             for port, skew in zip(all_ports, skew_list):
                 port.skew = skew
         
-    def get_waveform_information(self):
+    def _get_output_port_list(self):
+        port_list = list(self.port_list)
+        for port in self.port_table.nodes.values():
+            port_list += [port.q, port.r, port.a]
+        port_list += list(self.port_table.edges.values())
+        port_list += list(self.port_table.impas.values())
+        return port_list
+
+    def get_waveform_information(self, dtype=None, interleave=False, marker=False, segment_table=False, segment_granularity=1, sparse=False, cache=False, keep_compile=False):
         """get waveform information for I/O with measurement_tools
-        """
-        
+        Args:
+            dtype (np.dtype): output format of the waveform (see Sequence.get_waveform_information)
+            interleave (bool): return I and Q of the real dtype interleaved
+            marker (bool): add the marker which is high during the measurement windows
+            segment_table (bool): return the deduplicated segments and the playlist instead of the waveform
+            segment_granularity (int): number of samples the segment boundaries are aligned to
+            sparse (bool): return the segments covered by the pulses instead of the waveform
+            cache (bool or CompileCache): return the output of the identical circuit from the compile cache
+            keep_compile (bool): keep the compiled state for the incremental compile after update_variables
+        """
+        
+        output_format = {"dtype" : dtype, "interleave" : interleave, "marker" : marker, "segment_table" : segment_table, "segment_granularity" : segment_granularity, "sparse" : sparse}
+        _verify_output_format(output_format)
+        cache, fingerprint = self._get_cache_key(output_format, cache)
+        waveform_information = None if fingerprint is None else cache.get(fingerprint)
+        if waveform_information is not None:
+            if not keep_compile:
+                self.reset_compile()
+            return waveform_information
+
         if not self.flag["compiled"]:
             self.compile()
         
@@ -299,18 +331,8 @@ class CircuitBase(Sequence):
             rport = self._verify_port(port.r)
             aport = self._verify_port(port.a)
             
-            qdir = {
-                "daq_length" : qport.waveform.size*qport.DAC_STEP,
-                "measurement_windows" : qport.measurement_windows,
-                "waveform" : qport.waveform,
-                "waveform_updated" : False,
-            }
-            rdir = {
-                "daq_length" : rport.waveform.size*rport.DAC_STEP,
-                "measurement_windows" : aport.measurement_windows,
-                "waveform" : rport.waveform,
-                "waveform_updated" : False,
-            }
+            qdir = self._get_port_information(qport, **output_format)
+            rdir = self._get_port_information(rport, aport.measurement_windows, **output_format)
             
             waveform_information[f"Q{idx}"] = {
                 "qubit"   : qdir,
@@ -320,36 +342,29 @@ class CircuitBase(Sequence):
         for edge, port in self.port_table.edges.items():
             cport = self._verify_port(port)
 
-            cdir = {
-                "daq_length" : cport.waveform.size*cport.DAC_STEP,
-                "measurement_windows" : cport.measurement_windows,
-                "waveform" : cport.waveform,
-                "waveform_updated" : False,
-            }
+            cdir = self._get_port_information(cport, **output_format)
 
             waveform_information[f"Q{edge[1]}"]["cr"] = cdir
             
         for idx, port in self.port_table.impas.items():
             iport = self._verify_port(port)
             
-            idir = {
-                "daq_length" : iport.waveform.size*iport.DAC_STEP,
-                "measurement_windows" : iport.measurement_windows,
-                "waveform" : iport.waveform,
-                "waveform_updated" : False,
-            }
+            idir = self._get_port_information(iport, **output_format)
             
             waveform_information[f"I{idx}"] = {
                 "jpa"    : idir,
             }
             
-        self.reset_compile()
+        if fingerprint is not None:
+            cache.put(fingerprint, waveform_information)
+        if not keep_compile:
+            self.reset_compile()
             
         return waveform_information
 
 class Circuit(CircuitBase):
-    def __init__(self, backend):
-        super().__init__(backend)
+    def __init__(self, backend, use_template=False):
+        super().__init__(backend, use_template)
 
     def irx90(self, target):
         """Execute a inversed rx90 gate
@@ -535,6 +550,8 @@ class Circuit(CircuitBase):
             matrix (np.ndarray): matrix expression of the single-qubit gate
             target (int): index of the target qubit port
         """
+        from .util.decompose import matrix_to_su2
+
         phases = matrix_to_su2(matrix)
         self.rz(phases[2], target)
         self.rx90(target)
@@ -549,6 +566,8 @@ class Circuit(CircuitBase):
             control (int): index of the control qubit port
             target (int): index of the target qubit port
         """
+        from .util.decompose import matrix_to_su4
+
         gates = matrix_to_su4(matrix)
         self.su2(gates[0][0], control)
         self.su2(gates[0][1], target)
@@ -0,0 +1,251 @@
+import io
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from .sequence import _get_sweep_information, _verify_output_format
+from .cache import _copy_arrays
+
+_worker_object_list = []
+
+def _get_backend_object_list(backend):
+    """List the objects of the backend in a fixed order, which is reproduced on the copy of the backend in the workers
+    Args:
+        backend (Backend): backend shared by the sequences
+    Returns:
+        object_list (list): backend, ports, gates and their instructions
+    """
+    if backend is None:
+        return []
+    object_list = [backend]
+    port_table = backend.port_table
+    if port_table is not None:
+        object_list.append(port_table)
+        for qubit in port_table.nodes.values():
+            object_list += [qubit, qubit.q, qubit.r, qubit.a]
+        object_list += list(port_table.edges.values())
+        object_list += list(port_table.impas.values())
+    gate_table = backend.gate_table
+    if gate_table is not None:
+        object_list.append(gate_table)
+        for gate in list(gate_table.gate_table.values()) + list(gate_table.template_table.values()):
+            object_list.append(gate)
+            for instruction, _ in gate.instruction_list:
+                object_list.append(instruction)
+    return object_list
+
+class _BackendPickler(pickle.Pickler):
+    """Pickler sending the objects of the backend as references to the copy loaded in the workers"""
+
+    def __init__(self, file, object_index):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.object_index = object_index
+
+    def persistent_id(self, obj):
+        return self.object_index.get(id(obj))
+
+class _BackendUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        return _worker_object_list[pid]
+
+def _initialize(backend_bytes):
+    """Load the backend once in each worker"""
+    global _worker_object_list
+    backend = None if backend_bytes is None else pickle.loads(backend_bytes)
+    _worker_object_list = _get_backend_object_list(backend)
+
+def _pack(array_list):
+    """Copy the arrays into a shared memory block
+    Returns:
+        (str, list): name of the shared memory and (offset, dtype, shape) of each array
+    """
+    layout = []
+    nbytes = 0
+    for array in array_list:
+        layout.append((nbytes, array.dtype.str, array.shape))
+        nbytes += array.nbytes
+    shared_memory = SharedMemory(create=True, size=max(nbytes, 1))
+    for array, (offset, dtype, shape) in zip(array_list, layout):
+        np.ndarray(shape, dtype=dtype, buffer=shared_memory.buf, offset=offset)[...] = array
+    # the block is released by the main process after unpacking
+    resource_tracker.unregister(shared_memory._name, "shared_memory")
+    shared_memory.close()
+    return shared_memory.name, layout
+
+def _unpack(name, layout):
+    """Copy the arrays out of the shared memory block and release it
+    """
+    shared_memory = SharedMemory(name=name)
+    try:
+        return [np.ndarray(shape, dtype=dtype, buffer=shared_memory.buf, offset=offset).copy() for offset, dtype, shape in layout]
+    finally:
+        shared_memory.close()
+        shared_memory.unlink()
+
+class _SharedArray:
+    """Placeholder of an array sent through shared memory"""
+
+    def __init__(self, index):
+        self.index = index
+
+def _extract_arrays(information, array_list):
+    """Replace the arrays in the nested dictionaries and lists by placeholders appended to array_list"""
+    if isinstance(information, dict):
+        return {key : _extract_arrays(value, array_list) for key, value in information.items()}
+    if isinstance(information, list):
+        return [_extract_arrays(value, array_list) for value in information]
+    if isinstance(information, np.ndarray):
+        array_list.append(information)
+        return _SharedArray(len(array_list) - 1)
+    return information
+
+def _restore_arrays(information, array_list):
+    if isinstance(information, dict):
+        return {key : _restore_arrays(value, array_list) for key, value in information.items()}
+    if isinstance(information, list):
+        return [_restore_arrays(value, array_list) for value in information]
+    if isinstance(information, _SharedArray):
+        return array_list[information.index]
+    return information
+
+def _compile_task(task_bytes, output_format):
+    """Compile a sequence in a worker
+    Returns:
+        (dict, str, list): waveform information with the arrays replaced by placeholders, and the shared memory holding the arrays
+    """
+    sequence = _BackendUnpickler(io.BytesIO(task_bytes)).load()
+    array_list = []
+    waveform_information = _extract_arrays(sequence.get_waveform_information(**output_format), array_list)
+    return (waveform_information, *_pack(array_list))
+
+def _sweep_task(task_bytes, update_command_list):
+    """Compile the sweep points of a batch in a worker
+    Returns:
+        (list, str, list): measurement windows of each port at each point, and the shared memory holding the waveforms
+    """
+    sequence = _BackendUnpickler(io.BytesIO(task_bytes)).load()
+    waveform_dict, window_dict = sequence._compile_points(update_command_list)
+    sequence.reset_compile()
+    port_list = sequence.port_list
+    window_list = [{port.name : window_dict[port.name][index] for port in port_list} for index in range(len(update_command_list))]
+    waveform_list = [waveform_dict[port.name][index] for index in range(len(update_command_list)) for port in port_list]
+    return (window_list, *_pack(waveform_list))
+
+class CompileExecutor:
+    """Compile independent sequences or the points of a sweep on a pool of processes
+
+    The backend is pickled once when the executor starts and loaded by each worker in the initializer.
+    The ports, gates and instructions of the backend referred by a sequence are sent as references to that copy,
+    so that only the instructions specific to the sequence are pickled for each task.
+    The waveforms are sent back through shared memory.
+    The backend should not be modified while the executor is running.
+
+    Sequences must be picklable. Callables such as the compensations of IQPort must be defined at module level.
+    """
+
+    def __init__(self, backend=None, max_workers=None, mp_context=None):
+        """
+        Args:
+            backend (Backend): backend shared by the sequences, e.g. the backend of the Circuits
+            max_workers (int): number of processes. The number of CPUs is used if None.
+            mp_context (multiprocessing.context.BaseContext): context to start the processes
+        """
+        self.backend = backend
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+        self.object_index = {}
+        for index, obj in enumerate(_get_backend_object_list(backend)):
+            self.object_index.setdefault(id(obj), index)
+        backend_bytes = None if backend is None else pickle.dumps(backend, protocol=pickle.HIGHEST_PROTOCOL)
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context, initializer=_initialize, initargs=(backend_bytes,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+
+    def shutdown(self):
+        """Stop the workers"""
+        self.executor.shutdown()
+
+    def _dumps(self, sequence):
+        file = io.BytesIO()
+        _BackendPickler(file, self.object_index).dump(sequence)
+        return file.getvalue()
+
+    def compile(self, sequence_list, dtype=None, interleave=False, marker=False, segment_table=False, segment_granularity=1, sparse=False, cache=False):
+        """Compile the sequences concurrently
+        Args:
+            sequence_list (list): Sequences or Circuits
+            dtype, interleave, marker, segment_table, segment_granularity, sparse: output format (see Sequence.get_waveform_information)
+            cache (bool or CompileCache): return the outputs of the identical sequences from the compile cache of this process,
+                where the identical sequences in the list are compiled once
+        Returns:
+            waveform_information_list (list): waveform information of each sequence as returned by get_waveform_information
+        """
+        output_format = {"dtype" : dtype, "interleave" : interleave, "marker" : marker, "segment_table" : segment_table, "segment_granularity" : segment_granularity, "sparse" : sparse}
+        _verify_output_format(output_format)
+        waveform_information_list = [None]*len(sequence_list)
+        future_dict = {} # {fingerprint, or index of the sequence not cached : (future, cache, fingerprint, indices of the identical sequences)}
+        for index, sequence in enumerate(sequence_list):
+            tmp_cache, fingerprint = sequence._get_cache_key(output_format, cache)
+            if fingerprint is not None:
+                waveform_information_list[index] = tmp_cache.get(fingerprint)
+                if waveform_information_list[index] is not None:
+                    continue
+            key = index if fingerprint is None else fingerprint
+            if key not in future_dict:
+                future = self.executor.submit(_compile_task, self._dumps(sequence), {**output_format, "cache" : False})
+                future_dict[key] = (future, tmp_cache, fingerprint, [])
+            future_dict[key][3].append(index)
+
+        for future, tmp_cache, fingerprint, index_list in future_dict.values():
+            waveform_information, name, layout = future.result()
+            waveform_information = _restore_arrays(waveform_information, _unpack(name, layout))
+            if fingerprint is not None:
+                tmp_cache.put(fingerprint, waveform_information)
+            # the identical sequences get their own arrays
+            waveform_information_list[index_list[0]] = waveform_information
+            for index in index_list[1:]:
+                waveform_information_list[index] = _copy_arrays(waveform_information)
+        return waveform_information_list
+
+    def compile_sweep(self, sequence, variables, batch_size=None):
+        """Compile the sweep points of the variables concurrently
+        Args:
+            sequence (Sequence): sequence depending on the variables
+            variables (Variables): variables to be swept
+            batch_size (int): number of consecutive sweep points compiled in a task, where the incremental compile is effective.
+                The points are divided evenly into 4 tasks per worker if None.
+        Returns:
+            sweep_information (dict): same as Sequence.compile_sweep
+        """
+        if not hasattr(variables, "update_command_list"):
+            variables.compile()
+        update_command_list = variables.update_command_list
+        if batch_size is None:
+            batch_size = max(1, -(-len(update_command_list)//(4*self.max_workers)))
+
+        task_bytes = self._dumps(sequence)
+        future_list = []
+        for start in range(0, len(update_command_list), batch_size):
+            # the update commands only hold the changed variables, so that the first point of a batch gets the full state
+            batch = update_command_list[start:start + batch_size]
+            future_list.append(self.executor.submit(_sweep_task, task_bytes, [variables[variables.get_sweep_index(start)]] + batch[1:]))
+
+        port_list = sequence.port_list
+        waveform_dict = {port.name : [] for port in port_list}
+        window_dict = {port.name : [] for port in port_list}
+        for future in future_list:
+            window_list, name, layout = future.result()
+            waveform_list = _unpack(name, layout)
+            for index, windows in enumerate(window_list):
+                for port_index, port in enumerate(port_list):
+                    waveform_dict[port.name].append(waveform_list[index*len(port_list) + port_index])
+                    window_dict[port.name].append(windows[port.name])
+
+        waveform_dict = {port_name : variables.to_canonical_order(waveform_list) for port_name, waveform_list in waveform_dict.items()}
+        window_dict = {port_name : variables.to_canonical_order(window_list) for port_name, window_list in window_dict.items()}
+        return _get_sweep_information(port_list, waveform_dict, window_dict)
@@ -0,0 +1,197 @@
+import numpy as np
+
+def _matmul(matrix, vector):
+    """Multiply a real matrix by a complex vector as two real products, or a complex matrix as it is"""
+    if np.iscomplexobj(matrix):
+        return matrix @ vector
+    if vector.size == 0:
+        return np.zeros(matrix.shape[0], dtype=np.complex128)
+    vector = np.ascontiguousarray(vector, dtype=np.complex128)
+    return (matrix @ vector.view(np.float64).reshape(-1, 2)).view(np.complex128).ravel()
+
+class Filter:
+    """Predistortion filter applied on the waveform written by the Port
+
+    The waveform is processed block by block on a grid of block_size samples fixed from the first sample,
+    so that the result does not depend on how the waveform is divided into chunks.
+    The filter is applied on the complex samples, i.e. on I and Q at the same time,
+    and on the baseband relative to the frames in the "nco" mixing.
+    """
+
+    def __init__(self, block_size):
+        """
+        Args:
+            block_size (int): number of samples processed at once
+        """
+        self.block_size = block_size
+        self.tail = 0 # samples
+
+    def _get_config(self):
+        """Parameters of the filter excluding the caches, used as the key of the compile cache"""
+        return {"block_size" : self.block_size, "tail" : self.tail}
+
+    def _initial_state(self):
+        raise NotImplementedError()
+
+    def _process_block(self, block, state):
+        """Filter a block of samples
+        Args:
+            block (np.ndarray): samples of the block
+            state: state carried from the previous block
+        Returns:
+            (np.ndarray, state): filtered samples and the state carried to the next block
+        """
+        raise NotImplementedError()
+
+    def apply(self, waveform):
+        """Filter a whole waveform
+        Args:
+            waveform (np.ndarray): waveform
+        Returns:
+            filtered_waveform (np.ndarray): filtered waveform of the same length
+        """
+        stream = _FilterStream(self)
+        return np.concatenate([np.zeros(0, dtype=np.complex128)] + stream.feed(waveform) + stream.flush())
+
+class FIRFilter(Filter):
+    """Finite impulse response filter evaluated by the overlap-add FFT convolution"""
+
+    def __init__(self, taps, block_size=None):
+        """
+        Args:
+            taps (np.ndarray): impulse response sampled at DAC_STEP
+            block_size (int): number of samples convolved by a single FFT.
+                The power of two of at least 4 times the number of taps (minimum 1024) if None.
+        """
+        self.taps = np.asarray(taps)
+        if block_size is None:
+            block_size = max(1024, 1 << int(np.ceil(np.log2(4*self.taps.size))))
+        super().__init__(block_size)
+        self.tail = self.taps.size - 1
+        self.spectrum_dict = {}
+
+    def _get_config(self):
+        config = super()._get_config()
+        config["taps"] = self.taps
+        return config
+
+    def _get_spectrum(self, nfft):
+        if nfft not in self.spectrum_dict:
+            self.spectrum_dict[nfft] = np.fft.fft(self.taps, nfft)
+        return self.spectrum_dict[nfft]
+
+    def _initial_state(self):
+        return np.zeros(self.tail, dtype=np.complex128)
+
+    def _process_block(self, block, carry):
+        size = block.size + self.tail
+        nfft = 1 << int(np.ceil(np.log2(size)))
+        convolution = np.fft.ifft(np.fft.fft(block, nfft) * self._get_spectrum(nfft))[:size]
+        convolution[:self.tail] += carry
+        return convolution[:block.size], convolution[block.size:]
+
+class IIRFilter(Filter):
+    """Infinite impulse response filter with the difference equation of lfilter
+
+        a[0]*y[n] = b[0]*x[n] + b[1]*x[n-1] + ... - a[1]*y[n-1] - ...
+
+    The recursion is vectorized over a block as y = T x + O z with the Toeplitz matrix T of the impulse response
+    and the contribution O z of the state z carried from the previous block (transposed direct form II).
+    """
+
+    def __init__(self, b, a, tail=0, block_size=256):
+        """
+        Args:
+            b (np.ndarray): numerator coefficients
+            a (np.ndarray): denominator coefficients
+            tail (int): number of samples of the response kept after the end of the sequence
+            block_size (int): number of samples processed by a single matrix product
+        """
+        super().__init__(block_size)
+        b = np.atleast_1d(np.asarray(b))
+        a = np.atleast_1d(np.asarray(a))
+        if a[0] == 0:
+            raise Exception("the first denominator coefficient of IIRFilter must be non-zero")
+        self.order = max(a.size, b.size) - 1
+        self.b = np.pad(b, (0, self.order + 1 - b.size))/a[0]
+        self.a = np.pad(a, (0, self.order + 1 - a.size))/a[0]
+        self.tail = tail
+        self.matrix_dict = {}
+
+    def _get_config(self):
+        config = super()._get_config()
+        config.update(b=self.b, a=self.a)
+        return config
+
+    def _get_matrices(self, size):
+        """Evaluate the block matrices for a block of the size
+        Returns:
+            (np.ndarray, np.ndarray, np.ndarray, np.ndarray): matrices from the input and the state to the output and the next state
+        """
+        if size not in self.matrix_dict:
+            order = self.order
+            dtype = np.result_type(self.a, self.b, np.float64)
+            state_matrix = np.eye(order, k=1, dtype=dtype)
+            state_matrix[:, :1] = -self.a[1:, None]
+            input_vector = self.b[1:] - self.a[1:]*self.b[0]
+
+            output_matrix = np.zeros((size, order), dtype=dtype) # rows C A^k
+            row = np.eye(1, order, dtype=dtype)[0]
+            for index in range(size):
+                output_matrix[index] = row
+                row = row @ state_matrix
+            response = np.concatenate([[self.b[0]], output_matrix[:size - 1] @ input_vector])
+            index = np.arange(size)
+            lag = index[:, None] - index[None, :]
+            response_matrix = np.where(lag >= 0, response[np.clip(lag, 0, None)], 0)
+
+            state_input_matrix = np.zeros((order, size), dtype=dtype) # columns A^(size-1-j) B
+            column = input_vector
+            for index in reversed(range(size)):
+                state_input_matrix[:, index] = column
+                column = state_matrix @ column
+            block_state_matrix = np.linalg.matrix_power(state_matrix, size)
+            self.matrix_dict[size] = (response_matrix, output_matrix, state_input_matrix, block_state_matrix)
+        return self.matrix_dict[size]
+
+    def _initial_state(self):
+        return np.zeros(self.order, dtype=np.complex128)
+
+    def _process_block(self, block, state):
+        response_matrix, output_matrix, state_input_matrix, block_state_matrix = self._get_matrices(block.size)
+        output = _matmul(response_matrix, block) + _matmul(output_matrix, state)
+        state = _matmul(block_state_matrix, state) + _matmul(state_input_matrix, block)
+        return output, state
+
+class _FilterStream:
+    """Feed a waveform chunk by chunk into a filter, which is applied on complete blocks"""
+
+    def __init__(self, filter):
+        self.filter = filter
+        self.state = filter._initial_state()
+        self.pending = np.zeros(0, dtype=np.complex128)
+
+    def feed(self, samples):
+        """Returns:
+            block_list (list): filtered blocks completed by the samples
+        """
+        self.pending = np.concatenate([self.pending, samples])
+        block_list = []
+        block_size = self.filter.block_size
+        start = 0
+        while self.pending.size - start >= block_size:
+            block, self.state = self.filter._process_block(self.pending[start:start + block_size], self.state)
+            block_list.append(block)
+            start += block_size
+        self.pending = self.pending[start:].copy()
+        return block_list
+
+    def flush(self):
+        """Returns:
+            block_list (list): filtered block of the remaining samples at the end of the waveform
+        """
+        if self.pending.size == 0:
+            return []
+        block, self.state = self.filter._process_block(self.pending, self.state)
+        self.pending = np.zeros(0, dtype=np.complex128)
+        return [block]
@@ -1,3 +1,4 @@
+import copy
 from .instruction import Instruction
 
 class Acquire(Instruction):
@@ -7,7 +8,9 @@ class Acquire(Instruction):
 
     def _execute(self, port):
         duration = self.tmp_params["duration"]
-        self.measurement_window = (port.position, port.position + duration)
+        acquire = copy.copy(self)
+        acquire.measurement_window = (port.position, port.position + duration)
+        port.timeline.append(acquire)
         port._time_step(duration)
 
     def _acquire(self, port):
@@ -7,10 +7,10 @@ class _AlignManager:
         self.mode = mode
 
     def __enter__(self):
-        self.sequence.add(_AddAlign(self.mode), self.port)
+        self.sequence.add(_AddAlign(self.mode), self.port, copy=False)
 
     def __exit__(self, exception_type, exception_value, traceback):
-        self.sequence.add(_DelAlign(), self.port)
+        self.sequence.add(_DelAlign(), self.port, copy=False)
 
 class _AddAlign(Command):
     def __init__(self, mode):
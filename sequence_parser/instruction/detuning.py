@@ -2,19 +2,16 @@ import numpy as np
 from .command import Command
 
 class _DetuningManager:
-    global start_position
-    start_position = None
-    
     def __init__(self, sequence, port, detuning):
         self.sequence = sequence
         self.port = port
         self.detuning = detuning
 
     def __enter__(self):
-        self.sequence.add(_AddDetuning(self.detuning), self.port)
+        self.sequence.add(_AddDetuning(self.detuning), self.port, copy=False)
 
     def __exit__(self, exception_type, exception_value, traceback):
-        self.sequence.add(_DelDetuning(self.detuning), self.port)
+        self.sequence.add(_DelDetuning(self.detuning), self.port, copy=False)
 
 class _AddDetuning(Command):
     def __init__(self, detuning):
@@ -22,10 +19,10 @@ class _AddDetuning(Command):
         self.params = {"detuning" : detuning}
 
     def _execute(self, port):
-        global start_position
-        start_position = port.position
+        # kept on the port, since the ports are executed concurrently with compile(workers=N)
+        port.detuning_start_position = port.position
         detuning = self.tmp_params["detuning"]
-        port.phase -= 2*np.pi*detuning*start_position
+        port.phase -= 2*np.pi*detuning*port.detuning_start_position
         port.detuning = detuning
 
 class _DelDetuning(Command):
@@ -34,8 +31,7 @@ class _DelDetuning(Command):
         self.params = {"detuning" : detuning}
 
     def _execute(self, port):
-        global start_position
         end_position = port.position 
         detuning = self.tmp_params["detuning"]
-        port.phase += 2*np.pi*detuning*start_position
+        port.phase += 2*np.pi*detuning*port.detuning_start_position
         port.detuning = 0
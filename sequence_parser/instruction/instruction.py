@@ -29,13 +29,18 @@ class Instruction:
     def _execute(self, port):
         pass
 
+    def _get_extra_params(self):
+        """Settings kept outside params which determine the waveform, fingerprinted by the compile cache"""
+        return {}
+
     def _get_variable(self):
+        self.variables = []
         for inst in self.insts.values():
             inst._get_variable()
             self.variables += inst.variables
         for value in self.params.values():
             if isinstance(value, Variable):
-                self.variables.append(value)
+                self.variables += value.variables
 
     def _fix_variable(self):
         self.tmp_params = {}
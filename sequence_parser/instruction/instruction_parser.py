@@ -5,6 +5,7 @@ from .acquire import *
 from .trigger import *
 from .functional import *
 from .align import *
+from .align import _AddAlign, _DelAlign
 
 def parse(obj):
     obj = copy.deepcopy(obj)
@@ -1,3 +1,4 @@
+import copy
 import numpy as np
 from ..instruction import Instruction
 from .pulse_shape import *
@@ -27,22 +28,73 @@ class Pulse(Instruction):
     def _execute(self, port):
         self._fix_duration()
         self._fix_pulseshape()
-        self.position = port.position
-        self.phase = port.phase
-        self.detuning = port.detuning
+        pulse = copy.copy(self)
+        pulse.position = port.position
+        pulse.phase = port.phase
+        pulse.detuning = port.detuning
+        port.timeline.append(pulse)
         port._time_step(self.duration)
 
-    def _write(self, port, out: np.ndarray, delay: float = 0, factor: float = 1):
-        time = port.time - delay
+    def _get_window(self, port, size, delay=0, offset=0):
+        """Evaluate the sample index range touched by the pulse
+        Args:
+            port (Port): port the pulse is written on
+            size (int): number of samples in the output waveform
+            delay (float): additional delay of the pulse in ns
+            offset (int): sample index of the first sample of the output waveform
+        Returns:
+            (int, int): start and stop index, padded by one sample on both sides
+        """
+        start = int(np.floor((self.position + delay)/port.DAC_STEP - 0.5))
+        stop = int(np.ceil((self.position + delay + self.duration)/port.DAC_STEP - 0.5)) + 1
+        return max(start, offset), min(max(stop, offset), offset + size)
+
+    def _get_support(self, port, size, delay=0, offset=0):
+        """Evaluate the samples covered by the pulse
+        Args:
+            port (Port): port the pulse is written on
+            size (int): number of samples in the output waveform
+            delay (float): additional delay of the pulse in ns
+            offset (int): sample index of the first sample of the output waveform
+        Returns:
+            (int, int, np.ndarray, np.ndarray): start and stop index of the window, time and support mask in the window,
+                or None if the pulse is out of the waveform
+        """
+        start, stop = self._get_window(port, size, delay, offset)
+        if start >= stop:
+            return None
+        time = np.arange(start, stop)*port.DAC_STEP - delay
         relative_time = time - (self.position + self.duration / 2)
         flag_above = relative_time + self.duration/2 >= -0.5*port.DAC_STEP
         flag_below = relative_time - self.duration/2 <  -0.5*port.DAC_STEP
         support = flag_above & flag_below
-        envelope = self.pulse_shape.model_func(relative_time[support])
+        return start, stop, time, support
+
+    def _write(self, port, out: np.ndarray, delay: float = 0, factor: float = 1, offset: int = 0):
+        window = self._get_support(port, out.size, delay, offset)
+        if window is None:
+            return
+        start, stop, time, support = window
+        relative_time = time - (self.position + self.duration / 2)
+        envelope = envelope_cache.get(self.pulse_shape, relative_time[support])
         if_freq = port.if_freq + self.detuning
         phase_factor = np.exp(1j * (2*np.pi * if_freq * time[support] + self.phase))
         waveform = factor * envelope * phase_factor
-        out[support] += waveform
+        out[start - offset:stop - offset][support] += waveform
+
+    def _write_baseband(self, port, out: np.ndarray, delay: float = 0, factor: float = 1, offset: int = 0):
+        """Write the envelope multiplied by the constant phase factor of the pulse, without the carrier
+        Returns:
+            (int, int): start and stop index of the written window, or None if nothing is written
+        """
+        window = self._get_support(port, out.size, delay, offset)
+        if window is None:
+            return None
+        start, stop, time, support = window
+        relative_time = time - (self.position + self.duration / 2)
+        envelope = envelope_cache.get(self.pulse_shape, relative_time[support])
+        out[start - offset:stop - offset][support] += factor * np.exp(1j * self.phase) * envelope
+        return start, stop
 
 class Square(Pulse):
     def __init__(
@@ -182,16 +234,26 @@ class CRAB(Pulse):
         coefficients,
         polynominals,
     ):
+        """
+        Args:
+            envelope (Pulse): envelope modulated by the polynominals
+            coefficients (list): coefficient of each polynominal
+            polynominals (list): functions of the time normalized to [-1, 1], or the coefficients of np.polynomial.Polynomial.
+                Functions should be picklable (e.g. np.polynomial.Polynomial or defined at module level) to be compiled by CompileExecutor.
+        """
         super().__init__()
         self.pulse_shape = CRABShape()
         self.params = {}
         self.insts = {0:envelope}
         self.coefficients = coefficients
-        self.polynominals = polynominals
+        self.polynominals = [func if callable(func) else np.polynomial.Polynomial(func) for func in polynominals]
         
     def _get_duration(self):
         self.duration = self.insts[0].duration        
 
+    def _get_extra_params(self):
+        return {"coefficients" : self.coefficients, "polynominals" : self.polynominals}
+
 class Product(Pulse):
     def __init__(
         self,
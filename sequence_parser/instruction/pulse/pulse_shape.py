@@ -1,6 +1,127 @@
 import copy
+import threading
+from collections import OrderedDict
 import numpy as np
 
+def _to_key(value):
+    """Convert a resolved shape parameter into a hashable key"""
+    if isinstance(value, (int, float, complex, str)):
+        return value
+    if isinstance(value, PulseShape):
+        return value._get_key()
+    if isinstance(value, np.ndarray):
+        return ("ndarray", value.dtype.str, value.shape, value.tobytes())
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return tuple((key, _to_key(tmp)) for key, tmp in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_to_key(tmp) for tmp in value)
+    return value
+
+class EnvelopeCache:
+    """LRU cache of the envelopes evaluated by PulseShape.model_func
+
+    Envelopes are keyed by the shape class, the resolved shape parameters
+    and the sampled time grid (number of samples, first and last sample time),
+    so that the same pulse written at the same sub-sample offset is evaluated only once.
+    Cached envelopes are returned as read-only arrays.
+    The cache is shared by the ports written concurrently, so that the bookkeeping is guarded by a lock.
+    """
+
+    def __init__(self, maxsize=1024, max_bytes=64*2**20):
+        """
+        Args:
+            maxsize (int): maximum number of cached envelopes
+            max_bytes (int): maximum total size of the cached envelopes in bytes
+        """
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.lock = threading.Lock()
+        self.clear()
+
+    def __repr__(self):
+        return f"EnvelopeCache({self.info()})"
+
+    def clear(self):
+        """Drop all cached envelopes and reset the counters
+        """
+        with self.lock:
+            self.cache = OrderedDict()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def invalidate(self, shape_class=None):
+        """Drop cached envelopes
+        Args:
+            shape_class (type): drop only the envelopes of this PulseShape class. All envelopes are dropped if None.
+        """
+        with self.lock:
+            if shape_class is None:
+                keys = list(self.cache.keys())
+            else:
+                keys = [key for key in self.cache.keys() if key[0][0] is shape_class]
+            for key in keys:
+                self.nbytes -= self.cache.pop(key).nbytes
+
+    def info(self):
+        """Returns:
+            info (dict): counters and the current size of the cache
+        """
+        return {
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "evictions" : self.evictions,
+            "size" : len(self.cache),
+            "nbytes" : self.nbytes,
+        }
+
+    def _get_key(self, pulse_shape, time):
+        if time.size == 0:
+            return None
+        time_key = (time.size, round(float(time[0]), 9), round(float(time[-1]), 9))
+        return (pulse_shape._get_key(), time_key)
+
+    def get(self, pulse_shape, time):
+        """Evaluate pulse_shape.model_func(time) through the cache
+        Args:
+            pulse_shape (PulseShape): pulse shape with fixed parameters
+            time (np.ndarray): uniformly sampled time relative to the center of the pulse
+        Returns:
+            envelope (np.ndarray): read-only envelope
+        """
+        key = self._get_key(pulse_shape, time) if self.enabled else None
+        try:
+            with self.lock:
+                envelope = None if key is None else self.cache.get(key)
+                if envelope is not None:
+                    self.hits += 1
+                    self.cache.move_to_end(key)
+                    return envelope
+        except TypeError:
+            key = None
+        if key is None:
+            return pulse_shape.model_func(time)
+
+        envelope = np.array(pulse_shape.model_func(time))
+        envelope.setflags(write=False)
+        with self.lock:
+            self.misses += 1
+            if envelope.nbytes > self.max_bytes or key in self.cache:
+                return envelope
+            self.cache[key] = envelope
+            self.nbytes += envelope.nbytes
+            while len(self.cache) > self.maxsize or self.nbytes > self.max_bytes:
+                _, old = self.cache.popitem(last=False)
+                self.nbytes -= old.nbytes
+                self.evictions += 1
+        return envelope
+
+envelope_cache = EnvelopeCache()
+
 class PulseShape:
     def __init__(self):
         pass
@@ -11,6 +132,35 @@ class PulseShape:
     def model_func(self, time):
         raise NotImplementedError()
 
+    def _get_key(self):
+        """Key of the shape class and its resolved parameters used by the EnvelopeCache
+        """
+        return (self.__class__,) + tuple(_to_key(value) for value in vars(self).values())
+
+    def _split_amplitude(self):
+        """Split the envelope into the amplitude and the shape of the unit amplitude,
+        so that the pulses differing only in the amplitude are rendered once in Sequence.compile_sweep
+        Returns:
+            (complex, PulseShape): amplitude and the shape of the unit amplitude, or 1 and self if the envelope is not proportional to the amplitude
+        """
+        return 1, self
+
+def _split_amplitude(pulse_shape):
+    """Split a shape whose envelope is proportional to its amplitude parameter"""
+    unit_shape = copy.copy(pulse_shape)
+    unit_shape.amplitude = 1
+    return pulse_shape.amplitude, unit_shape
+
+def _split_inner_amplitude(pulse_shape, name):
+    """Split a shape which is linear in the envelope of the inner shape stored as the attribute of the name"""
+    inner_shape = getattr(pulse_shape, name)
+    amplitude, unit_inner_shape = inner_shape._split_amplitude()
+    if unit_inner_shape is inner_shape:
+        return 1, pulse_shape
+    unit_shape = copy.copy(pulse_shape)
+    setattr(unit_shape, name, unit_inner_shape)
+    return amplitude, unit_shape
+
 class SquareShape(PulseShape):
     def __init__(self):
         super().__init__()
@@ -23,6 +173,9 @@ class SquareShape(PulseShape):
         waveform = self.amplitude*np.ones(time.size)
         return waveform
 
+    def _split_amplitude(self):
+        return _split_amplitude(self)
+
 class StepShape(PulseShape):
     def __init__(self):
         super().__init__()
@@ -41,6 +194,9 @@ class StepShape(PulseShape):
         waveform = np.hstack([fwaveform, mwaveform, bwaveform])
         return waveform
 
+    def _split_amplitude(self):
+        return _split_amplitude(self)
+
 class GaussianShape(PulseShape):
     def __init__(self):
         super().__init__()
@@ -58,6 +214,11 @@ class GaussianShape(PulseShape):
             waveform = self.amplitude*(waveform - edge)/(self.amplitude - edge)
         return waveform
 
+    def _split_amplitude(self):
+        if self.zero_end:
+            return 1, self
+        return _split_amplitude(self)
+
 class RaisedCosShape(PulseShape):
     def __init__(self):
         super().__init__()
@@ -71,6 +232,9 @@ class RaisedCosShape(PulseShape):
         waveform = 0.5*self.amplitude*(1 + np.cos(phase))
         return waveform
 
+    def _split_amplitude(self):
+        return _split_amplitude(self)
+
 class HyperbolicSecantShape(PulseShape):
     def __init__(self):
         super().__init__()
@@ -89,6 +253,11 @@ class HyperbolicSecantShape(PulseShape):
         if self.amplitude == 0:
             waveform = 0*time
         return waveform
+
+    def _split_amplitude(self):
+        if self.zero_end:
+            return 1, self
+        return _split_amplitude(self)
     
 class HalfDRAGShape(PulseShape):
     def __init__(self):
@@ -103,6 +272,9 @@ class HalfDRAGShape(PulseShape):
         waveform = tmp - 1j*self.beta*np.gradient(tmp)/np.gradient(time)
         return waveform
 
+    def _split_amplitude(self):
+        return _split_inner_amplitude(self, "pulseshape")
+
 class FlatTopShape(PulseShape):
     def __init__(self):
         super().__init__()
@@ -120,6 +292,9 @@ class FlatTopShape(PulseShape):
         waveform = np.hstack([fwaveform, mwaveform, bwaveform])
         return waveform
 
+    def _split_amplitude(self):
+        return _split_inner_amplitude(self, "pulseshape")
+
 class CRABShape(PulseShape):
     def __init__(self):
         super().__init__()
@@ -137,6 +312,9 @@ class CRABShape(PulseShape):
         waveform = distortion * envelope
         return waveform
 
+    def _split_amplitude(self):
+        return _split_inner_amplitude(self, "envelope_shape")
+
 class DeriviativeShape(PulseShape):
     def __init__(self):
         super().__init__()
@@ -148,6 +326,9 @@ class DeriviativeShape(PulseShape):
         waveform = self.pulseshape.model_func(time)
         return np.gradient(waveform)/np.gradient(time)
 
+    def _split_amplitude(self):
+        return _split_inner_amplitude(self, "pulseshape")
+
 class ProductShape(PulseShape):
     def __init__(self):
         super().__init__()
@@ -162,6 +343,9 @@ class ProductShape(PulseShape):
         waveform = waveform_a * np.exp(1j*np.pi*waveform_p)
         return waveform
 
+    def _split_amplitude(self):
+        return _split_inner_amplitude(self, "pulseshape_a")
+
 
 class PolynomialRaisedCosShape(PulseShape):
     def __init__(self):
@@ -181,3 +365,6 @@ class PolynomialRaisedCosShape(PulseShape):
 
         return np.cos(
             np.pi * time / self.duration)**2 * self.amplitude * a 
+
+    def _split_amplitude(self):
+        return _split_amplitude(self)
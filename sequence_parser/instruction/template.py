@@ -0,0 +1,160 @@
+import copy
+import numpy as np
+from .pulse.pulse import Pulse
+from .command import Delay, VirtualZ
+from .align import _AddAlign, _DelAlign
+
+class Template(Pulse):
+    """Precompiled block of instructions on a single port
+
+    The instructions are executed once at construction to fix the duration,
+    the phase footprint of the VirtualZ and the relative positions of the pulses.
+    The baseband samples are rendered once for each IF frequency and stamped at
+    the scheduled position with a single complex phase factor.
+    """
+
+    def __init__(self, inst_list):
+        from ..port import Port
+
+        super().__init__()
+        self.params = {}
+        self.insts = dict(zip(range(len(inst_list)), inst_list))
+
+        port = Port("template")
+        for inst in inst_list:
+            inst._fix_variable()
+            inst._execute(port)
+        self.duration = port.position
+        self.phase_shift = port.phase
+        self.pulse_list = port.timeline
+        self.extent = (
+            min(pulse.position for pulse in self.pulse_list),
+            max(pulse.position + pulse.duration for pulse in self.pulse_list),
+        )
+        self.block_dict = {}
+
+    @staticmethod
+    def _is_available(inst_list):
+        """Check whether the instructions can be replaced by a Template
+        Args:
+            inst_list (list): instructions on a single port between triggers
+        """
+        depth = 0
+        for inst in inst_list:
+            if not isinstance(inst, (Pulse, Delay, VirtualZ, _AddAlign, _DelAlign)):
+                return False
+            if isinstance(inst, Template) or len(inst.variables) > 0:
+                return False
+            if isinstance(inst, _AddAlign):
+                depth += 1
+            if isinstance(inst, _DelAlign):
+                depth -= 1
+                if depth < 0:
+                    return False
+        has_pulse = any(isinstance(inst, Pulse) for inst in inst_list)
+        return depth == 0 and has_pulse
+
+    def _fix_duration(self):
+        pass
+
+    def _fix_pulseshape(self):
+        pass
+
+    def _get_window(self, port, size, delay=0, offset=0):
+        start = int(np.floor((self.position + self.extent[0] + delay)/port.DAC_STEP - 0.5))
+        stop = int(np.ceil((self.position + self.extent[1] + delay)/port.DAC_STEP - 0.5)) + 1
+        return max(start, offset), min(max(stop, offset), offset + size)
+
+    def _execute(self, port):
+        if port.align_modes[-1][0] != "sequential":
+            for inst in self.insts.values():
+                inst._execute(port)
+            return
+
+        template = copy.copy(self)
+        template.position = port.position
+        template.phase = port.phase
+        template.detuning = port.detuning
+        port.timeline.append(template)
+        port.phase += self.phase_shift
+        port._time_step(self.duration)
+
+    def _get_block(self, if_freq, dac_step):
+        """Render the pulses relative to the start of the template
+        Args:
+            if_freq (float): IF frequency including the detuning, or None for the block without the carrier
+            dac_step (float): sampling interval of the port
+        Returns:
+            (int, np.ndarray): sample offset of the block from the start of the template, and the block
+        """
+        key = (if_freq, dac_step)
+        if key not in self.block_dict:
+            from ..port import Port
+
+            port = Port("template", if_freq=0 if if_freq is None else if_freq)
+            port.DAC_STEP = dac_step
+            start = min(int(np.floor(pulse.position/dac_step - 0.5)) for pulse in self.pulse_list)
+            stop = max(int(np.ceil((pulse.position + pulse.duration)/dac_step - 0.5)) + 1 for pulse in self.pulse_list)
+            block = np.zeros(stop - start, dtype=np.complex128)
+            for pulse in self.pulse_list:
+                pulse = copy.copy(pulse)
+                pulse.position -= start*dac_step
+                if if_freq is None:
+                    pulse._write_baseband(port, out=block)
+                else:
+                    pulse._write(port, out=block)
+            block.setflags(write=False)
+            self.block_dict[key] = (start, block)
+        return self.block_dict[key]
+
+    def _get_pulse_list(self):
+        """Returns:
+            pulse_list (list): pulses of the template placed at the position of the template
+        """
+        pulse_list = []
+        for pulse in self.pulse_list:
+            pulse = copy.copy(pulse)
+            pulse.position += self.position
+            pulse.phase += self.phase
+            pulse.detuning = self.detuning
+            pulse_list.append(pulse)
+        return pulse_list
+
+    def _is_aligned(self, port, delay):
+        offset = round(self.position/port.DAC_STEP)
+        return delay == 0 and abs(self.position - offset*port.DAC_STEP) <= 1e-9*port.DAC_STEP
+
+    def _write(self, port, out: np.ndarray, delay: float = 0, factor: float = 1, offset: int = 0):
+        if not self._is_aligned(port, delay):
+            for pulse in self._get_pulse_list():
+                pulse._write(port, out, delay, factor, offset)
+            return
+
+        if_freq = port.if_freq + self.detuning
+        start, block = self._get_block(if_freq, port.DAC_STEP)
+        start += round(self.position/port.DAC_STEP)
+        begin, end = max(start, offset), min(start + block.size, offset + out.size)
+        if begin >= end:
+            return
+        phase_factor = np.exp(1j * (2*np.pi * if_freq * start*port.DAC_STEP + self.phase))
+        out[begin - offset:end - offset] += factor * phase_factor * block[begin - start:end - start]
+
+    def _write_baseband(self, port, out: np.ndarray, delay: float = 0, factor: float = 1, offset: int = 0):
+        """Write the pulses without the carrier
+        Returns:
+            (int, int): start and stop index of the written window, or None if nothing is written
+        """
+        if not self._is_aligned(port, delay):
+            window_list = [pulse._write_baseband(port, out, delay, factor, offset) for pulse in self._get_pulse_list()]
+            window_list = [window for window in window_list if window is not None]
+            if len(window_list) == 0:
+                return None
+            return min(window[0] for window in window_list), max(window[1] for window in window_list)
+
+        start, block = self._get_block(None, port.DAC_STEP)
+        start += round(self.position/port.DAC_STEP)
+        begin, end = max(start, offset), min(start + block.size, offset + out.size)
+        if begin >= end:
+            return None
+        out[begin - offset:end - offset] += factor * np.exp(1j * self.phase) * block[begin - start:end - start]
+        return begin, end
@@ -1,58 +1,119 @@
-import copy
-from typing import Callable
+from typing import Callable, Union
 
 import numpy as np
 
-from .instruction.acquire import Acquire
-from .instruction.pulse.pulse import Pulse
 from .port import Port
+from .instruction.pulse.pulse_shape import envelope_cache
+from .instruction.template import Template
 
 
+class Constant:
+    """Compensation independent of the IF frequency
+
+    Unlike a lambda, it can be pickled together with the IQPort.
+    """
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return f"Constant({self.value})"
+
+    def __call__(self, freq):
+        return self.value
+
+def _to_callable(value):
+    return value if callable(value) else Constant(value)
+
 class IQPort(Port):
-    """A Port which compensates for the amplitude and delay imbalances of an IQ mixer"""
+    """A Port which compensates for the amplitude and delay imbalances of an IQ mixer
+
+    The compensations are functions of the IF frequency. They should be picklable
+    (e.g. Constant, functions defined at module level, or functools.partial of them)
+    to send the IQPort to the workers of CompileExecutor.
+    """
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.i_factor = lambda freq: 1
-        self.q_factor = lambda freq: 1
-        self.i_delay = lambda freq: 0
-        self.q_delay = lambda freq: 0
+        self.i_factor = Constant(1)
+        self.q_factor = Constant(1)
+        self.i_delay = Constant(0)
+        self.q_delay = Constant(0)
+        self.compensation_dict = {}
+
+    def set_i_factor(self, i_factor: Union[Callable[[float], float], float]):
+        """multiply I waveform by `i_factor(if_freq)`, or by `i_factor` if it is a number"""
+        self.i_factor = _to_callable(i_factor)
 
-    def set_i_factor(self, i_factor: Callable[[float], float]):
-        """multiply I waveform by `i_factor(if_freq)`"""
-        self.i_factor = i_factor
+    def set_q_factor(self, q_factor: Union[Callable[[float], float], float]):
+        """multiply Q waveform by `q_factor(if_freq)`, or by `q_factor` if it is a number"""
+        self.q_factor = _to_callable(q_factor)
 
-    def set_q_factor(self, q_factor: Callable[[float], float]):
-        """multiply Q waveform by `q_factor(if_freq)`"""
-        self.q_factor = q_factor
+    def set_i_delay(self, i_delay: Union[Callable[[float], float], float]):
+        """delay I waveform by `i_delay(if_freq)` ns, or by `i_delay` ns if it is a number"""
+        self.i_delay = _to_callable(i_delay)
 
-    def set_i_delay(self, i_delay: Callable[[float], float]):
-        """delay I waveform by `i_delay(if_freq)` ns"""
-        self.i_delay = i_delay
+    def set_q_delay(self, q_delay: Union[Callable[[float], float], float]):
+        """delay Q waveform by `q_delay(if_freq)` ns, or by `q_delay` ns if it is a number"""
+        self.q_delay = _to_callable(q_delay)
 
-    def set_q_delay(self, q_delay: Callable[[float], float]):
-        """delay Q waveform by `q_delay(if_freq)` ns"""
-        self.q_delay = q_delay
+    def _get_config(self):
+        config = super()._get_config()
+        config.update(i_factor=self.i_factor, q_factor=self.q_factor, i_delay=self.i_delay, q_delay=self.q_delay)
+        return config
 
-    def _write_waveform(self, waveform_length):
-        """Write waveform by the Pulse instructions
+    def _get_compensation(self, if_freq):
+        """Evaluate the compensations once for each IF frequency in a compile
         Args:
-            waveform_length (float): total waveform time length
+            if_freq (float): IF frequency including the detuning of the pulse
+        Returns:
+            (float, float, float, float): I factor, Q factor, I delay and Q delay
         """
-        self.time = np.arange(0, waveform_length, self.DAC_STEP)
-        i_waveform = np.zeros(self.time.size, dtype=np.complex128)
-        q_waveform = np.zeros_like(i_waveform)
-        for instruction in self.syncronized_instruction_list:
-            if isinstance(instruction, Pulse):
-                # get the compensation parameters at the IF frequency of the pulse
-                if_freq = self.if_freq + self.detuning
-                i_factor = self.i_factor(if_freq)
-                q_factor = self.q_factor(if_freq)
-                i_delay = self.i_delay(if_freq)
-                q_delay = self.q_delay(if_freq)
-                instruction._write(self, out=i_waveform, delay=i_delay, factor=i_factor)
-                instruction._write(self, out=q_waveform, delay=q_delay, factor=q_factor)
-            elif isinstance(instruction, Acquire):
-                instruction._acquire(self)
-
-        self.waveform = i_waveform.real + 1j * q_waveform.imag
+        if if_freq not in self.compensation_dict:
+            self.compensation_dict[if_freq] = (self.i_factor(if_freq), self.q_factor(if_freq), self.i_delay(if_freq), self.q_delay(if_freq))
+        return self.compensation_dict[if_freq]
+
+    def _prepare_waveform(self):
+        if self.mixing != "pulse":
+            raise Exception(f"IQPort supports only the \"pulse\" mixing (Port : {self.name}).")
+        self.compensation_dict = {}
+        return super()._prepare_waveform()
+
+    def _can_write_sweep(self):
+        # the I and Q factors do not commute with the complex factors of the pulses
+        return False
+
+    def _get_pulse_window(self, instruction, size, offset=0):
+        _, _, i_delay, q_delay = self._get_compensation(self.if_freq + instruction.detuning)
+        i_start, i_stop = instruction._get_window(self, size, delay=i_delay, offset=offset)
+        q_start, q_stop = instruction._get_window(self, size, delay=q_delay, offset=offset)
+        return min(i_start, q_start), max(i_stop, q_stop)
+
+    def _render_pulse(self, instruction, out, offset, baseband=False, frame=None):
+        """Write the I and Q waveforms of a pulse with the compensation of the IQ mixer in a single pass
+
+        The carrier is evaluated once on the window, and the delayed carrier of each quadrature is obtained
+        by the constant phase factor exp(-2j*pi*if_freq*delay). The envelope of a quadrature delayed
+        by an integer number of samples from the other one is taken from the envelope cache.
+        """
+        if isinstance(instruction, Template):
+            for pulse in instruction._get_pulse_list():
+                self._render_pulse(pulse, out, offset)
+            return
+
+        if_freq = self.if_freq + instruction.detuning
+        i_factor, q_factor, i_delay, q_delay = self._get_compensation(if_freq)
+        start, stop = self._get_pulse_window(instruction, out.size, offset)
+        if start >= stop:
+            return
+        time = np.arange(start, stop)*self.DAC_STEP
+        carrier = np.exp(1j * (2*np.pi * if_freq * time + instruction.phase))
+        window = out[start - offset:stop - offset]
+        for part, factor, delay in [("real", i_factor, i_delay), ("imag", q_factor, q_delay)]:
+            relative_time = time - delay - (instruction.position + instruction.duration/2)
+            flag_above = relative_time + instruction.duration/2 >= -0.5*self.DAC_STEP
+            flag_below = relative_time - instruction.duration/2 < -0.5*self.DAC_STEP
+            support = flag_above & flag_below
+            envelope = envelope_cache.get(instruction.pulse_shape, relative_time[support])
+            waveform = factor * np.exp(-2j*np.pi * if_freq * delay) * envelope * carrier[support]
+            getattr(window, part)[support] += getattr(waveform, part)
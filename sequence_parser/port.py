@@ -1,10 +1,37 @@
 import copy
+import functools
+import hashlib
+import time
 import numpy as np
 from .instruction.trigger import Trigger
 from .instruction.acquire import Acquire
 from .instruction.pulse.pulse import Pulse
 from .instruction.command import Delay
 from .instruction.functional import Container
+from .instruction.template import Template
+from .filter import _FilterStream
+
+@functools.lru_cache(maxsize=64)
+def _get_carrier_table(if_freq, dac_step, max_period=4096):
+    """Evaluate one period of the carrier sampled at dac_step
+    Returns:
+        carrier_table (np.ndarray): carrier over the shortest period within max_period samples, or None if there is no such period
+    """
+    for period in range(1, max_period + 1):
+        cycle = if_freq*dac_step*period
+        if abs(cycle - round(cycle)) < 1e-12:
+            return np.exp(1j * 2*np.pi * if_freq * np.arange(period)*dac_step)
+    return None
+
+def _merge_windows(window_list):
+    """Merge overlapping sample windows (start, stop) into contiguous segments"""
+    segment_list = []
+    for start, stop in sorted(window_list):
+        if segment_list and start <= segment_list[-1][1]:
+            segment_list[-1][1] = max(segment_list[-1][1], stop)
+        else:
+            segment_list.append([start, stop])
+    return segment_list
 
 class Port:
     """Port management class for timedomain measurement"""
@@ -21,20 +48,99 @@ class Port:
         self.DAC_STEP = 1.0 # ns
         self.skew = 0.0 # ns
         self.skew_delay = 0.0 # ns
+        self.mixing = "pulse" # "pulse" : carrier for each pulse, "port" : carrier for each constant-frequency segment, "nco" : no carrier
+        self.filter_list = [] # predistortion filters applied in order on the written waveform
+        self.render_time_dict = None # {instruction class name : (count, render time)} while the compile stats are collected
         self._reset()
 
     def __repr__(self):
         return str(self.name)
 
+    def _get_config(self):
+        """Settings of the port which change the compiled waveform, used as the key of the compile cache"""
+        return {
+            "name" : self.name,
+            "if_freq" : self.if_freq,
+            "max_amp" : self.max_amp,
+            "DAC_STEP" : self.DAC_STEP,
+            "skew" : self.skew,
+            "skew_delay" : self.skew_delay,
+            "mixing" : self.mixing,
+            "filter_list" : self.filter_list,
+        }
+
+    @property
+    def time(self):
+        """Sampling time of the written waveform, evaluated on access"""
+        if self.waveform_size is None:
+            return None
+        return np.arange(self.waveform_size)*self.DAC_STEP
+
+    @property
+    def waveform(self):
+        """Dense waveform, materialized from segment_list on the first access"""
+        if self._waveform is None and self.segment_list is not None:
+            waveform = np.zeros(self.waveform_size, dtype=np.complex128)
+            for start, samples in self.segment_list:
+                waveform[start:start + samples.size] = samples
+            # the segments refer to the dense waveform, so that the samples are not held twice
+            self.segment_list = [(start, waveform[start:start + samples.size]) for start, samples in self.segment_list]
+            self._waveform = waveform
+        return self._waveform
+
+    @waveform.setter
+    def waveform(self, waveform):
+        self._waveform = waveform
+        self.segment_list = None
+        self.waveform_size = None if waveform is None else waveform.size
+
+    def _get_segments(self):
+        """Returns:
+            segment_list (list): sorted list of (start index, samples) of the written waveform, where the other samples are zero
+        """
+        if self.segment_list is not None:
+            return self.segment_list
+        if self._waveform is None:
+            return []
+        return [(0, self._waveform)]
+
+    def _get_nbytes(self):
+        """Returns:
+            nbytes (int): bytes of the samples held by the port
+        """
+        if self._waveform is not None:
+            return self._waveform.nbytes
+        return sum(samples.nbytes for _, samples in self._get_segments())
+
     def __str__(self):
         return str(self.name)
 
+    def add_filter(self, filter):
+        """Append a predistortion filter applied on the written waveform
+        Args:
+            filter (Filter): FIRFilter or IIRFilter. The waveform is extended by its tail.
+        """
+        self.filter_list.append(filter)
+
+    def _get_filter_tail(self):
+        """Returns:
+            tail (float): time length of the filter responses kept after the last instruction
+        """
+        return sum(filter.tail for filter in self.filter_list)*self.DAC_STEP
+
+    def _get_pulse_count(self):
+        """Returns:
+            count (int): number of the executed pulses
+        """
+        return sum(isinstance(instruction, Pulse) for instruction in self.timeline)
+
     def _reset(self):
         """Initialize all elements
         """
         self.instruction_list = []
         self.syncronized_instruction_list = None
-        self.waveform = None
+        self.waveform = None # also clears segment_list and waveform_size
+        self.frame_table = None
         self.measurement_windows = []
         self._execute_reset()
 
@@ -44,7 +150,9 @@ class Port:
         self.position = 0
         self.phase = 0
         self.detuning = 0
+        self.detuning_start_position = None # position where the detuning of the current block starts
         self.align_modes = [("sequential", [])]
+        self.timeline = [] # executed Pulse and Acquire with their own position
 
     def _add(self, instruction):
         """Add Instruction into the instruction_list
@@ -140,24 +248,542 @@ class Port:
         """Execute all instructions
         """
         self._execute_reset()
+        self.frame_list = [(0, self.if_freq + self.detuning, self.phase)]
         for instruction in self.syncronized_instruction_list:
             instruction._execute(self)
+            frame = (self.if_freq + self.detuning, self.phase)
+            if frame != self.frame_list[-1][1:]:
+                self.frame_list.append((self.position, *frame))
+
+    def _get_frame_table(self):
+        """Convert the frame updates recorded by the execution into the frame table
+
+        Returns:
+            frame_table (list): list of (time, frequency, phase), where the carrier exp(1j*(2*pi*frequency*time + phase))
+                is applied from the sample at time until the next update
+        """
+        frame_table = []
+        for position, if_freq, phase in self.frame_list:
+            index = max(int(np.ceil(position/self.DAC_STEP - 0.5)), 0)
+            if frame_table and frame_table[-1][0] == index*self.DAC_STEP:
+                frame_table.pop()
+            frame_table.append((index*self.DAC_STEP, if_freq, phase))
+        return frame_table
+
+    def _write_nco_baseband(self, instruction, out, offset, frame_index, frame_freq, frame_phase):
+        """Write a pulse relative to the frame played by the NCO
+        Args:
+            instruction (Pulse): executed pulse
+            out (np.ndarray): samples [offset, offset + out.size) of the waveform
+            offset (int): sample index of the first sample of out
+            frame_index (np.ndarray): first sample index of each frame
+            frame_freq (np.ndarray): frequency of each frame
+            frame_phase (np.ndarray): phase of each frame
+        """
+        window = instruction._get_support(self, out.size, offset=offset)
+        if window is None:
+            return
+        start, stop, _, support = window
+        support_index = np.flatnonzero(support)
+        if support_index.size == 0:
+            return
+        # the frame is chosen over the samples where the envelope is written, excluding the padding of the window
+        first, last = np.searchsorted(frame_index, start + support_index[[0, -1]], side="right") - 1
+        if first == last and frame_freq[first] == self.if_freq + instruction.detuning:
+            instruction._write_baseband(self, out=out, offset=offset, factor=np.exp(-1j*frame_phase[first]))
+            return
+
+        # the frame changes during the pulse, so that the pulse is demodulated sample by sample
+        pulse = copy.copy(instruction)
+        pulse.position -= start*self.DAC_STEP
+        pulse.phase += 2*np.pi*(self.if_freq + instruction.detuning)*start*self.DAC_STEP
+        block = np.zeros(stop - start, dtype=np.complex128)
+        pulse._write(self, out=block)
+        index = np.arange(start, stop)
+        frame = np.searchsorted(frame_index, index, side="right") - 1
+        out[start - offset:stop - offset] += block*np.exp(-1j*(2*np.pi*frame_freq[frame]*index*self.DAC_STEP + frame_phase[frame]))
+
+    def _apply_frame_table(self, waveform, if_freq=0):
+        """Multiply the carrier described by the frame table
+        Args:
+            waveform (np.ndarray): baseband waveform written in the "nco" mixing
+            if_freq (float): frequency subtracted from the frames, e.g. port.if_freq to obtain the baseband at the IF frequency
+        """
+        mixed_waveform = np.empty_like(waveform)
+        index_list = [round(time/self.DAC_STEP) for time, _, _ in self.frame_table] + [waveform.size]
+        for (_, freq, phase), start, stop in zip(self.frame_table, index_list[:-1], index_list[1:]):
+            freq = freq - if_freq
+            if freq == 0:
+                carrier = np.exp(1j*phase)
+            else:
+                carrier = np.exp(1j*(2*np.pi*freq*np.arange(start, stop)*self.DAC_STEP + phase))
+            mixed_waveform[start:stop] = waveform[start:stop]*carrier
+        return mixed_waveform
+
+    def _get_waveform(self, baseband=False):
+        """Get the written waveform
+        Args:
+            baseband (bool): whether to return the waveform at baseband or at port.if_freq
+        """
+        if self.mixing == "nco":
+            return self._apply_frame_table(self.waveform, self.if_freq if baseband else 0)
+        if baseband:
+            return np.exp(-1j*(2*np.pi*self.if_freq*self.time))*self.waveform
+        return self.waveform
+
+    def _get_marker(self, measurement_windows):
+        """Evaluate the marker which is high during the measurement windows
+        Args:
+            measurement_windows (list): list of (start, end) in ns
+        """
+        marker = np.zeros(self.waveform_size, dtype=np.uint8)
+        for start, end in measurement_windows:
+            start = max(int(np.ceil(start/self.DAC_STEP - 0.5)), 0)
+            end = max(int(np.ceil(end/self.DAC_STEP - 0.5)), 0)
+            marker[start:end] = 1
+        return marker
+
+    def _convert_waveform(self, dtype, interleave=False, marker=None, samples=None):
+        """Convert the waveform into the DAC-native format with the full scale of max_amp
+        Args:
+            dtype (np.dtype): np.complex64, np.float32, or np.int16
+            interleave (bool): return I and Q interleaved as [I0, Q0, I1, Q1, ...] instead of stacked as [[I...], [Q...]] (real dtype only)
+            marker (np.ndarray): marker packed into the least significant bit of I (np.int16 only)
+            samples (np.ndarray): samples to be converted instead of the whole waveform, e.g. a segment
+        Returns:
+            waveform (np.ndarray): converted waveform clipped to the full scale
+            clipping (dict): peak amplitude relative to the full scale, and number of clipped samples
+        """
+        dtype = np.dtype(dtype)
+        if samples is None:
+            samples = self.waveform
+        i_waveform = samples.real/self.max_amp
+        q_waveform = samples.imag/self.max_amp
+        over = (np.abs(i_waveform) > 1) | (np.abs(q_waveform) > 1)
+        clipping = {
+            "peak" : float(max(np.max(np.abs(i_waveform), initial=0), np.max(np.abs(q_waveform), initial=0))),
+            "clipped_samples" : int(np.count_nonzero(over)),
+        }
+        np.clip(i_waveform, -1, 1, out=i_waveform)
+        np.clip(q_waveform, -1, 1, out=q_waveform)
+
+        if dtype == np.complex64:
+            waveform = np.empty(samples.size, dtype=np.complex64)
+            waveform.real = i_waveform
+            waveform.imag = q_waveform
+            return waveform, clipping
+
+        if dtype == np.float32:
+            waveform = np.empty((samples.size, 2) if interleave else (2, samples.size), dtype=np.float32)
+        elif dtype == np.int16:
+            full_scale = np.iinfo(np.int16).max if marker is None else np.iinfo(np.int16).max >> 1
+            i_waveform = np.rint(i_waveform*full_scale)
+            q_waveform = np.rint(q_waveform*full_scale)
+            waveform = np.empty((samples.size, 2) if interleave else (2, samples.size), dtype=np.int16)
+        else:
+            raise ValueError(f"dtype : {dtype} is not supported. please use [complex64, float32, int16].")
+
+        iq_waveform = waveform.T if interleave else waveform
+        iq_waveform[0] = i_waveform
+        iq_waveform[1] = q_waveform
+        if dtype == np.int16 and marker is not None:
+            iq_waveform[0] = (iq_waveform[0] << 1) | marker
+            iq_waveform[1] = iq_waveform[1] << 1
+        if interleave:
+            waveform = waveform.reshape(-1)
+        return waveform, clipping
+
+    def _get_segment_table(self, waveform, interleave=False, granularity=1):
+        """Split the waveform at the pulse boundaries and the idle gaps, and deduplicate the segments by their content
+
+        The boundaries are the edges of the groups of overlapping pulses aligned down to the granularity,
+        and the segments without any non-zero sample are left out as idle.
+        Identical segments played back to back are merged into a single entry of the playlist with the repeat count.
 
-    def _write_waveform(self, waveform_length):
-        """Write waveform by the Pulse instructions
+        Args:
+            waveform (np.ndarray): waveform of the port in the output format (see _convert_waveform)
+            interleave (bool): whether I and Q of the waveform are interleaved
+            granularity (int): number of samples the boundaries are aligned to, e.g. the segment quantum of the AWG
+        Returns:
+            segment_table (dict): "library" : list of the unique segments in the format of the waveform,
+                "playlist" : list of (start index, segment index, repeat) sorted by the start index, where the segment is played repeat times back to back,
+                "compression_ratio" : number of samples of the waveform over that of the library
+        """
+        size = self.waveform_size
+        def get_samples(start, stop):
+            if waveform.ndim == 2:
+                return waveform[:, start:stop]
+            if interleave:
+                return waveform[2*start:2*stop]
+            return waveform[start:stop]
+
+        # the windows are padded by one sample on both sides, which is kept outside the waveform at the edges,
+        # and the pulses sharing a sample are kept in a segment
+        span_list = []
+        for instruction in self.timeline:
+            if isinstance(instruction, Pulse):
+                start, stop = self._get_pulse_window(instruction, size + 2, offset=-1)
+                if start + 1 < stop - 1:
+                    span_list.append((start + 1, stop - 1))
+        boundary_set = {0, size}
+        group = None
+        for start, stop in sorted(span_list):
+            if group is not None and start < group[1]:
+                group[1] = max(group[1], stop)
+                continue
+            if group is not None:
+                boundary_set |= set(group)
+            group = [start, stop]
+        if group is not None:
+            boundary_set |= set(group)
+        boundary_list = sorted({min(max(boundary - boundary % granularity, 0), size) for boundary in boundary_set} | {size})
+
+        library = []
+        hash_dict = {}
+        playlist = []
+        for start, stop in zip(boundary_list[:-1], boundary_list[1:]):
+            samples = get_samples(start, stop)
+            if not np.any(samples):
+                continue
+            key = hashlib.blake2b(np.ascontiguousarray(samples).tobytes(), digest_size=16).digest()
+            if key not in hash_dict:
+                hash_dict[key] = len(library)
+                library.append(np.array(samples))
+            index = hash_dict[key]
+            if playlist and playlist[-1][1] == index and playlist[-1][0] + playlist[-1][2]*(stop - start) == start:
+                playlist[-1] = (playlist[-1][0], index, playlist[-1][2] + 1)
+            else:
+                playlist.append((start, index, 1))
+
+        library_size = sum(segment.shape[-1] for segment in library)//(2 if interleave else 1)
+        return {
+            "library" : library,
+            "playlist" : playlist,
+            "compression_ratio" : size/library_size if library_size > 0 else float("inf"),
+        }
+
+    def _get_carrier(self, if_freq, start, stop):
+        """Evaluate the carrier exp(2j*pi*if_freq*time) on the samples [start, stop)
+        """
+        carrier_table = _get_carrier_table(if_freq, self.DAC_STEP)
+        if carrier_table is None:
+            return np.exp(1j * 2*np.pi * if_freq * np.arange(start, stop)*self.DAC_STEP)
+        return carrier_table[np.arange(start, stop) % carrier_table.size]
+
+    def _get_waveform_size(self, waveform_length):
+        """Returns:
+            size (int): number of samples of the waveform
+        """
+        return int(np.ceil(waveform_length/self.DAC_STEP))
+
+    def _allocate_waveform(self, waveform_length, out=None):
+        """Allocate the waveform
         Args:
             waveform_length (float): total waveform time length
+            out (np.ndarray): zero-initialized buffer (e.g. np.memmap) of at least the waveform size to be written in place
         """
-        self.time = np.arange(0, waveform_length, self.DAC_STEP)
-        self.waveform = np.zeros(self.time.size, dtype=np.complex128)
-        
-        for instruction in self.syncronized_instruction_list:
+        size = self._get_waveform_size(waveform_length)
+        if out is None:
+            return np.zeros(size, dtype=np.complex128)
+        if out.size < size:
+            raise ValueError(f"buffer of {out.size} samples is shorter than the waveform of {size} samples (Port : {self.name}).")
+        return out[:size]
+
+    def _get_pulse_window(self, instruction, size, offset=0):
+        """Evaluate the sample window [start, stop) written by the pulse within the samples [offset, offset + size)
+        """
+        return instruction._get_window(self, size, offset=offset)
+
+    def _render_pulse(self, instruction, out, offset, baseband=False, frame=None):
+        """Write a pulse on the samples [offset, offset + out.size) containing its sample window
+        Args:
+            instruction (Pulse): executed pulse
+            out (np.ndarray): samples of the waveform
+            offset (int): sample index of the first sample of out
+            baseband (bool): write the pulse without the carrier in the "port" mixing
+            frame (tuple): first sample index, frequency and phase of each frame in the "nco" mixing
+        """
+        if self.mixing == "nco":
+            self._write_nco_baseband(instruction, out, offset, *frame)
+        elif baseband:
+            instruction._write_baseband(self, out=out, offset=offset)
+        else:
+            instruction._write(self, out=out, offset=offset)
+
+    def _get_segment_list(self, size):
+        """Group the executed pulses into the segments rendered at once
+        Args:
+            size (int): number of samples of the waveform
+        Returns:
+            segment_list (list): list of (start, stop, pulse list, carrier frequency) in the order to be added,
+                where the carrier frequency is None unless the pulses are written in the baseband and mixed together
+        """
+        segment_list = []
+        baseband_list = []
+        carrier_freq = None
+        for instruction in self.timeline:
             if isinstance(instruction, Pulse):
-                instruction._write(self, out=self.waveform)
+                start, stop = self._get_pulse_window(instruction, size)
+                if start >= stop:
+                    continue
+                # in the "port" mixing, the overlapping pulses at the first frequency share a single carrier
+                if_freq = self.if_freq + instruction.detuning
+                if carrier_freq is None:
+                    carrier_freq = if_freq
+                if self.mixing == "port" and if_freq == carrier_freq:
+                    baseband_list.append((start, stop, instruction))
+                else:
+                    segment_list.append((start, stop, [instruction], None))
+
+        window_list = _merge_windows([(start, stop) for start, stop, _ in baseband_list])
+        mixed_segment_list = [(start, stop, [], carrier_freq) for start, stop in window_list]
+        segment_index = np.searchsorted([start for start, _ in window_list], [start for start, _, _ in baseband_list], side="right") - 1
+        for index, (_, _, instruction) in zip(segment_index, baseband_list):
+            mixed_segment_list[index][2].append(instruction)
+        return mixed_segment_list + segment_list
+
+    def _render_segment(self, segment, out, offset, frame=None):
+        """Write a segment on the samples [offset, offset + out.size) containing it
+        """
+        start, stop, pulse_list, carrier_freq = segment
+        for instruction in pulse_list:
+            if self.render_time_dict is None:
+                self._render_pulse(instruction, out, offset, carrier_freq is not None, frame)
+                continue
+            begin = time.perf_counter()
+            self._render_pulse(instruction, out, offset, carrier_freq is not None, frame)
+            name = instruction.__class__.__name__
+            count, elapsed = self.render_time_dict.get(name, (0, 0.0))
+            self.render_time_dict[name] = (count + 1, elapsed + time.perf_counter() - begin)
+        if carrier_freq is not None:
+            out[start - offset:stop - offset] *= self._get_carrier(carrier_freq, start, stop)
+
+    def _prepare_waveform(self):
+        """Collect the measurement windows and the frames before the pulses are rendered
+        Returns:
+            frame (tuple): first sample index, frequency and phase of each frame in the "nco" mixing, or None
+        """
+        frame = None
+        if self.mixing == "nco":
+            self.frame_table = self._get_frame_table()
+            frame = (
+                np.array([round(time/self.DAC_STEP) for time, _, _ in self.frame_table]),
+                np.array([freq for _, freq, _ in self.frame_table]),
+                np.array([phase for _, _, phase in self.frame_table]),
+            )
+        for instruction in self.timeline:
             if isinstance(instruction, Acquire):
                 instruction._acquire(self)
+        return frame
+
+    def _render_waveform(self, size, chunk_samples, out=None):
+        """Write the waveform chunk by chunk before the filters
+
+        The sample windows of the executed pulses are indexed by their start,
+        so that only the pulses overlapping a chunk are rendered, each of them once.
+        A pulse crossing the boundary of the chunks is rendered on its own window and kept until its last chunk,
+        so that every sample is evaluated by the same operations as the whole waveform.
+
+        Args:
+            size (int): number of samples of the waveform
+            chunk_samples (int): number of samples of a chunk, the last chunk may be shorter
+            out (np.ndarray): zero-initialized buffer of the waveform size the chunks are written into
+        Yields:
+            (np.ndarray, list): samples [offset, offset + chunk_samples) of the waveform, and the sample windows covered by the pulses
+        """
+        frame = self._prepare_waveform()
+        segment_list = self._get_segment_list(size)
+        order = sorted(range(len(segment_list)), key=lambda index: segment_list[index][0])
+        next_segment = 0
+        block_dict = {}
+        for offset in range(0, size, chunk_samples):
+            end = min(offset + chunk_samples, size)
+            chunk = np.zeros(end - offset, dtype=np.complex128) if out is None else out[offset:end]
+            while next_segment < len(order) and segment_list[order[next_segment]][0] < end:
+                block_dict[order[next_segment]] = None
+                next_segment += 1
+
+            window_list = []
+            for index in sorted(block_dict):
+                start, stop = segment_list[index][:2]
+                if offset <= start and stop <= end:
+                    self._render_segment(segment_list[index], chunk, offset, frame)
+                    window_list.append((start, stop))
+                    continue
+                if block_dict[index] is None:
+                    block_dict[index] = np.zeros(stop - start, dtype=np.complex128)
+                    self._render_segment(segment_list[index], block_dict[index], start, frame)
+                begin, finish = max(start, offset), min(stop, end)
+                chunk[begin - offset:finish - offset] += block_dict[index][begin - start:finish - start]
+                window_list.append((begin, finish))
+            for index in [index for index in block_dict if segment_list[index][1] <= end]:
+                del block_dict[index]
+            yield chunk, window_list
+
+    def _iter_waveform(self, size, chunk_samples, out=None):
+        """Write the waveform chunk by chunk and apply the filters
+
+        The filters process blocks fixed from the first sample regardless of chunk_samples,
+        so that the chunks are identical to the filtered waveform written at once.
+        A chunk is yielded when the filters have processed all of its samples.
+
+        Args:
+            size (int): number of samples of the waveform
+            chunk_samples (int): number of samples of a chunk, the last chunk may be shorter
+            out (np.ndarray): zero-initialized buffer of the waveform size the chunks are written into
+        Yields:
+            chunk (np.ndarray): samples [offset, offset + chunk_samples) of the waveform
+        """
+        peak = 0
+        if len(self.filter_list) == 0:
+            for offset, (chunk, window_list) in zip(range(0, size, chunk_samples), self._render_waveform(size, chunk_samples, out)):
+                # only the samples covered by the pulses are read, so that the silent part of a memory-mapped waveform is never loaded
+                for begin, finish in _merge_windows(window_list):
+                    peak = max(peak, np.max(np.abs(chunk[begin - offset:finish - offset])))
+                yield chunk
+        else:
+            render_iterator = self._render_waveform(size, chunk_samples, out)
+            stream_list = [_FilterStream(filter) for filter in self.filter_list]
+            filtered_list = []
+            filtered = 0
+            for offset in range(0, size, chunk_samples):
+                end = min(offset + chunk_samples, size)
+                while filtered < end:
+                    chunk = next(render_iterator, None)
+                    block_list = [] if chunk is None else [chunk[0]]
+                    for stream in stream_list:
+                        block_list = [output for block in block_list for output in stream.feed(block)]
+                        if chunk is None:
+                            block_list += stream.flush()
+                    for block in block_list:
+                        # the rendered samples are already fed into the filters, so that the filtered block overwrites them
+                        if out is not None:
+                            out[filtered:filtered + block.size] = block
+                        else:
+                            filtered_list.append(block)
+                        filtered += block.size
+
+                if out is not None:
+                    chunk = out[offset:end]
+                else:
+                    filtered_list = np.split(np.concatenate(filtered_list), [end - offset])
+                    chunk = filtered_list.pop(0)
+                peak = max(peak, np.max(np.abs(chunk)))
+                yield chunk
+
+        if peak > np.nextafter(self.max_amp, np.inf):
+            print(f'sequence amplitude should be below {self.max_amp} (Port : {self.name}).')
+
+    def _write_segments(self, size):
+        """Write the waveform as the segments covered by the pulses into segment_list
+
+        The segments of _get_segment_list are added in the same order as in _iter_waveform,
+        so that the samples are identical to the dense waveform.
+
+        Args:
+            size (int): number of samples of the waveform
+        """
+        frame = self._prepare_waveform()
+        segment_list = self._get_segment_list(size)
+        window_list = _merge_windows([segment[:2] for segment in segment_list])
+        block_list = [np.zeros(stop - start, dtype=np.complex128) for start, stop in window_list]
+        window_index = np.searchsorted([start for start, _ in window_list], [segment[0] for segment in segment_list], side="right") - 1
+        for segment, index in zip(segment_list, window_index):
+            self._render_segment(segment, block_list[index], window_list[index][0], frame)
+
+        peak = max([np.max(np.abs(block)) for block in block_list], default=0)
+        if peak > np.nextafter(self.max_amp, np.inf):
+            print(f'sequence amplitude should be below {self.max_amp} (Port : {self.name}).')
+        self.waveform = None
+        self.segment_list = [(start, block) for (start, _), block in zip(window_list, block_list)]
+        self.waveform_size = size
+
+    def _can_write_sweep(self):
+        """Whether the sweep points can be written together by _write_sweep, where each pulse is written with its own carrier"""
+        return self.mixing == "pulse" and len(self.filter_list) == 0
+
+    def _get_sweep_pulses(self, template_dict):
+        """Describe the executed pulses as the pulses of the unit amplitude and zero phase multiplied by complex factors
+        Args:
+            template_dict (dict): {key : pulse of the unit amplitude and zero phase}, into which the new pulses are added
+        Returns:
+            pulse_list (list): list of (key, factor) of the executed pulses in the order of the timeline
+        """
+        pulse_list = []
+        for instruction in self.timeline:
+            if not isinstance(instruction, Pulse):
+                continue
+            if isinstance(instruction, Template):
+                # the copies of a Template executed at the sweep points share the pulse list of the original
+                amplitude, unit_shape, shape_key = 1, None, ("Template", id(instruction.pulse_list))
             else:
-                pass
-            
-        if np.max(np.abs(self.waveform)) > np.nextafter(self.max_amp, np.inf):
+                amplitude, unit_shape = instruction.pulse_shape._split_amplitude()
+                shape_key = unit_shape._get_key()
+            key = (instruction.position, instruction.detuning, instruction.duration, shape_key)
+            try:
+                template = template_dict.get(key)
+            except TypeError:
+                key = ("unhashable", len(template_dict))
+                template = None
+            if template is None:
+                # the pulse shape is shared with the instruction and set again at the next sweep point
+                template = copy.copy(instruction)
+                if unit_shape is not None:
+                    template.pulse_shape = copy.deepcopy(unit_shape)
+                template.phase = 0
+                template_dict[key] = template
+            pulse_list.append((key, amplitude*np.exp(1j*instruction.phase)))
+        return pulse_list
+
+    def _write_sweep(self, template_dict, pulse_list_list, size):
+        """Write the waveforms of the sweep points at once
+
+        Each pulse of the unit amplitude and zero phase is rendered once,
+        and added to all the sweep points sharing it, multiplied by their amplitudes and phase factors in a single numpy operation.
+
+        Args:
+            template_dict (dict): {key : pulse of the unit amplitude and zero phase}
+            pulse_list_list (list): pulse_list of _get_sweep_pulses at each sweep point
+            size (int): number of samples of the longest waveform
+        Returns:
+            waveform (np.ndarray): waveforms of shape (number of sweep points, size) padded with zeros
+        """
+        waveform = np.zeros((len(pulse_list_list), size), dtype=np.complex128)
+        for index in range(max(map(len, pulse_list_list), default=0)):
+            # the pulses of the same index are added once to each sweep point, in the order of the timeline
+            group_dict = {}
+            for point, pulse_list in enumerate(pulse_list_list):
+                if index < len(pulse_list):
+                    key, factor = pulse_list[index]
+                    point_list, factor_list = group_dict.setdefault(key, ([], []))
+                    point_list.append(point)
+                    factor_list.append(factor)
+            for key, (point_list, factor_list) in group_dict.items():
+                template = template_dict[key]
+                start, stop = self._get_pulse_window(template, size)
+                if start >= stop:
+                    continue
+                block = np.zeros(stop - start, dtype=np.complex128)
+                self._render_pulse(template, block, start)
+                waveform[point_list, start:stop] += np.multiply.outer(factor_list, block)
+
+        if waveform.size and np.max(np.abs(waveform)) > np.nextafter(self.max_amp, np.inf):
             print(f'sequence amplitude should be below {self.max_amp} (Port : {self.name}).')
+        return waveform
+
+    def _write_waveform(self, waveform_length, out=None):
+        """Write waveform by the Pulse instructions
+
+        Without the buffer and the filters, the waveform is kept as the segments covered by the pulses,
+        and the dense waveform is materialized on the first access to Port.waveform.
+
+        Args:
+            waveform_length (float): total waveform time length
+            out (np.ndarray): zero-initialized buffer (e.g. np.memmap) to write the waveform in place
+        """
+        if out is None and len(self.filter_list) == 0:
+            self._write_segments(self._get_waveform_size(waveform_length))
+            return
+        self.waveform = self._allocate_waveform(waveform_length, out)
+        for _ in self._iter_waveform(self.waveform.size, max(self.waveform.size, 1), out=self.waveform):
+            pass
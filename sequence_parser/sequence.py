@@ -1,14 +1,19 @@
+import os
+import contextlib
 from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import matplotlib.pyplot as plt
 from .port import Port
 from .variable import Variable
 from .instruction.instruction import Instruction
 from .instruction.trigger import Trigger
 from .instruction.command import Delay
 from .instruction.align import _AlignManager
+from .instruction.detuning import _DetuningManager
 from .stochastic_sequence import StochasticSequence
 from .util.topological_sort import weighted_topological_sort
+from .stats import CompileStats, _measure
+from .cache import compile_cache, _FingerprintState
 
 sequencer_rc_context = {
     'ytick.minor.visible': False,
@@ -25,6 +30,48 @@ sequencer_rc_context = {
     'axes.linewidth': 1.0
 }
 
+def _get_sweep_information(port_list, waveform_dict, window_dict):
+    """Stack the waveforms of the sweep points padded with zeros to a common length
+    Args:
+        port_list (list): list of the Ports
+        waveform_dict (dict): {port_name : list of the waveforms at each sweep point}
+        window_dict (dict): {port_name : list of the measurement windows at each sweep point}
+    """
+    sweep_information = {}
+    for port in port_list:
+        waveform_list = waveform_dict[port.name]
+        waveform_size = max([waveform.size for waveform in waveform_list], default=0)
+        waveform = np.zeros((len(waveform_list), waveform_size), dtype=np.complex128)
+        for index, tmp_waveform in enumerate(waveform_list):
+            waveform[index, :tmp_waveform.size] = tmp_waveform
+        sweep_information[port.name] = {
+            "daq_length" : waveform_size*port.DAC_STEP,
+            "measurement_windows" : window_dict[port.name],
+            "waveform" : waveform,
+        }
+    return sweep_information
+
+def _get_duration_variable_names(instruction):
+    """Names of the variables given to the duration parameters of the instruction and its sub-instructions"""
+    variable_name_list = []
+    for inst in instruction.insts.values():
+        variable_name_list += _get_duration_variable_names(inst)
+    for key, value in instruction.params.items():
+        if key.endswith("duration") and isinstance(value, Variable):
+            variable_name_list += [variable.name for variable in value.variables]
+    return variable_name_list
+
+def _verify_output_format(output_format):
+    """Check the combination of the options of get_waveform_information
+    Args:
+        output_format (dict): dtype, interleave, marker, segment_table, segment_granularity, and sparse
+    """
+    if output_format["sparse"] and output_format["segment_table"]:
+        raise ValueError("sparse and segment_table cannot be combined")
+    dtype = output_format["dtype"]
+    if output_format["sparse"] and output_format["marker"] and dtype is not None and np.dtype(dtype) == np.int16:
+        raise ValueError("the marker cannot be packed into the np.int16 samples of the sparse segments")
+
 class Sequence:
     """Pulse sequence management class for timedomain measurement"""
 
@@ -60,6 +107,11 @@ class Sequence:
         self.port_list = []
         self.instruction_list = []
         self.variable_dict = {}
+        self.updated_variable_set = None
+        self.waveform_out = None
+        self.compile_stats = None
+        self.stats_collector = None
+        self.fingerprint_state = _FingerprintState()
         self.flag = {"compiled" : False}
 
     def _verify_port(self, port):
@@ -87,12 +139,18 @@ class Sequence:
             raise Exception(f"{variable} is not Variable object")
         if variable.name not in self.variable_dict.keys():
             self.variable_dict[variable.name] = []
-        self.variable_dict[variable.name].append(variable)
+        if variable not in self.variable_dict[variable.name]:
+            self.variable_dict[variable.name].append(variable)
 
     def _verify_instruction(self, instruction, copy=True):
         """Verify new instruction
+
+        The instructions given by the user are deep-copied, so that they can be modified after being added.
+        The internal paths adding the instructions created on the spot or the gates in GateTable pass copy=False
+        to share them, where the shared instructions must not be modified afterwards.
         Args:
             instruction (Instruction): Pulse, Command, or Trigger
+            copy (bool): add a deep copy of the instruction
         """
         if not isinstance(instruction, Instruction):
             raise Exception(f"{instruction} is not Instruction object")
@@ -108,6 +166,7 @@ class Sequence:
         Args:
             instruction (Instruction): Pulse, Command, or Trigger
             port (Port): control port for qubit drive, cavity drive, cross resonance, or impa pump
+            copy (bool): add a deep copy of the instruction. False shares the instruction, which must not be modified afterwards.
         """
         port = self._verify_port(port)
         instruction = self._verify_instruction(instruction, copy)
@@ -138,10 +197,11 @@ class Sequence:
         """
         return _DetuningManager(self, port, detuning)
 
-    def call(self, sequence):
+    def call(self, sequence, copy=True):
         """Combine the instruction_list with the other sequence
         Args:
             sequence (Sequence): sequence
+            copy (bool): add deep copies of the instructions. False shares them, e.g. for the gates in GateTable.
         """
         if isinstance(sequence, StochasticSequence):
             sequence = sequence._fix_sequence()
@@ -150,7 +210,7 @@ class Sequence:
             if isinstance(instruction, Trigger):
                 self.trigger(port, align=instruction.align)
             else:
-                self.add(instruction, port)
+                self.add(instruction, port, copy=copy)
 
     def update_variables(self, update_command):
         """update values in variables
@@ -160,6 +220,8 @@ class Sequence:
         for variable_name, index in update_command.items():
             for variable in self.variable_dict[variable_name]:
                 variable._set_value(index)
+            if self.updated_variable_set is not None:
+                self.updated_variable_set.add(variable_name)
 
         self.flag["compiled"] = False
         
@@ -173,14 +235,209 @@ class Sequence:
         self.compiled_instruction_list = []
         for port in self.port_list:
             port._reset()
-            
+
+        self.updated_variable_set = None
         self.flag["compiled"] = False
 
-    def compile(self):
+    def _get_compile_key(self):
+        """Summary of the instructions and the port settings (Port._get_config) which invalidates the incremental compile when changed,
+        where the filters are compared by identity
+        """
+        port_key = tuple(
+            tuple((key, tuple(map(id, value)) if key == "filter_list" else value) for key, value in port._get_config().items())
+            for port in self.port_list
+        )
+        return (len(self.instruction_list), port_key)
+
+    def _map_ports(self, function, port_list, *args_list, workers=None):
+        """Apply the function to each port, concurrently on a thread pool if workers > 1
+
+        The ports share no state while they are executed and written (the state carried between the instructions,
+        e.g. the start of a detuning block, is kept on the port), so that the result does not depend on the order in which the threads run.
+
+        Args:
+            function (callable): function (port, *args) -> result
+            port_list (list): list of the Ports
+            args_list (list): lists of the additional arguments for each port
+            workers (int): number of threads
+        Returns:
+            result_list (list): results in the order of port_list
+        """
+        if workers is None or workers <= 1 or len(port_list) <= 1:
+            return list(map(function, port_list, *args_list))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(function, port_list, *args_list))
+
+    def _recompile(self, workers=None, stats=None, write=True):
+        """Re-execute only the ports depending on the variables updated since the last compile
+        Args:
+            workers (int): number of threads writing the waveforms
+            stats (CompileStats): stats the stages are recorded into
+            write (bool): write the waveforms of the re-executed ports
+        Returns:
+            success (bool): False if the trigger positions have to be solved again with the full compile
+        """
+        dirty_port_name_set = set()
+        for variable_name in self.updated_variable_set:
+            dirty_port_name_set |= self.variable_port_dict.get(variable_name, set())
+        dirty_port_list = [port for port in self.port_list if port.name in dirty_port_name_set]
+
+        ## fix variables
+        with _measure(stats, "fix_variable"):
+            for instruction, port in self.instruction_list:
+                if not isinstance(instruction, Trigger) and port.name in dirty_port_name_set:
+                    instruction._fix_variable()
+
+        ## re-append instructions on the dirty Ports and check the trigger edges
+        for port in dirty_port_list:
+            last_position = port.position
+            last_trigger_edge_list = port.trigger_edge_list
+            with _measure(stats, "add"):
+                port.instruction_list = []
+                for instruction, tmp_port in self.compiled_instruction_list:
+                    if isinstance(instruction, Trigger):
+                        if port in tmp_port:
+                            port._add(instruction)
+                    elif tmp_port is port:
+                        port._add(instruction)
+            with _measure(stats, "trigger_edge"):
+                trigger_edge_list = port._get_trigger_edge_list()
+            if trigger_edge_list != last_trigger_edge_list:
+                return False
+
+            with _measure(stats, "sync_trigger_position"):
+                port._sync_trigger_position(self.trigger_position_list)
+                port._sync_skew(self.max_skew - port.skew)
+            with _measure(stats, "execute_instructions"):
+                port._execute_instructions()
+            if port.position != last_position:
+                return False
+
+        ## write waveform
+        if write:
+            out_list = []
+            for port in dirty_port_list:
+                port.measurement_windows = []
+                out = None
+                if self.waveform_out is not None:
+                    out = port.waveform
+                    out.fill(0)
+                out_list.append(out)
+            self._write_waveforms(dirty_port_list, out_list, workers, stats)
+
+        self.updated_variable_set = set()
+        self.flag["compiled"] = True
+        return True
+
+    def _get_waveform_buffer(self, port, out):
+        """Prepare the zero-initialized buffer the waveform of the port is written into
+        Args:
+            port (Port): port to be written
+            out (str or callable): directory of the .npy memmap files, or function (port_name, size) -> buffer
+        Returns:
+            buffer (np.ndarray): buffer of the waveform size, or None to allocate it in memory
+        """
+        if out is None:
+            return None
+        size = port._get_waveform_size(self.max_skew + self.max_waveform_lenght)
+        if callable(out):
+            buffer = out(port.name, size)[:size]
+            buffer.fill(0)
+            return buffer
+        # a newly created file is filled with zeros without touching the pages
+        path = os.path.join(out, f"{port.name}.npy")
+        return np.lib.format.open_memmap(path, mode="w+", dtype=np.complex128, shape=(size,))
+
+    def compile(self, out=None, workers=None, stats=False):
         """Compile the instructions
 
+        After update_variables, only the ports depending on the updated variables are executed again,
+        and the trigger positions are reused as long as the durations between the triggers are unchanged.
+
+        Args:
+            out (str or callable): if given, the waveforms are written in place instead of being allocated in memory.
+                A directory path stores the waveform of each port in "<port name>.npy" as np.memmap,
+                and a function (port_name, size) -> buffer returns the caller-provided buffer (e.g. shared memory)
+                of at least the given number of complex samples.
+            workers (int): if larger than 1, the instructions are executed and the waveforms are written
+                for each port concurrently on a thread pool of this size. The result is identical to the serial compile.
+            stats (bool): record the wall time of each stage, the pulses and samples of each port,
+                and the render time of each instruction class into compile_stats.
+                The stats are always recorded inside collect_stats.
+        """
+        self.compile_stats = CompileStats() if stats or self.stats_collector is not None else None
+        self._compile(out, workers, self.compile_stats)
+        if self.compile_stats is not None:
+            self.compile_stats.compile_count = 1
+            if self.stats_collector is not None:
+                self.stats_collector.merge(self.compile_stats)
+
+    def _compile(self, out, workers, stats, write=True):
+        if not self.flag["compiled"] and self.updated_variable_set is not None:
+            if self._is_same_out(out) and self.compile_key == self._get_compile_key() and self._recompile(workers, stats, write):
+                return
+
+        self._schedule(workers, stats)
+
+        ## write waveform
+        self.waveform_out = out
+        if write:
+            out_list = [self._get_waveform_buffer(port, out) for port in self.port_list]
+            self._write_waveforms(self.port_list, out_list, workers, stats)
+
+        self.compile_key = self._get_compile_key()
+        self.updated_variable_set = set()
+        self.flag["compiled"] = True
+
+    def _is_same_out(self, out):
+        """Check whether the waveforms are written to the same place as the last compile
+        Args:
+            out (str or callable): argument of compile
+        """
+        if out is None or self.waveform_out is None or callable(out):
+            return out is self.waveform_out
+        return not callable(self.waveform_out) and os.path.abspath(out) == os.path.abspath(self.waveform_out)
+
+    def _write_waveforms(self, port_list, out_list, workers=None, stats=None):
+        """Write the waveforms of the ports
+        Args:
+            port_list (list): ports to be written
+            out_list (list): buffer of each port, or None to allocate it in memory
+            workers (int): number of threads writing the waveforms
+            stats (CompileStats): stats the written ports are recorded into
+        """
+        waveform_length = self.max_skew + self.max_waveform_lenght
+        for port in port_list:
+            port.render_time_dict = None if stats is None else {}
+        try:
+            with _measure(stats, "write_waveform"):
+                self._map_ports(lambda port, out: port._write_waveform(waveform_length, out=out), port_list, out_list, workers=workers)
+            if stats is not None:
+                for port, out in zip(port_list, out_list):
+                    stats._add_port(port, out)
+        finally:
+            for port in port_list:
+                port.render_time_dict = None
+
+    @contextlib.contextmanager
+    def collect_stats(self):
+        """Aggregate the compile stats over the compiles in the context, e.g. over a sweep
+        Yields:
+            stats (CompileStats): aggregated stats
+        """
+        stats = CompileStats()
+        self.stats_collector = stats
+        try:
+            yield stats
+        finally:
+            self.stats_collector = None
+
+    def _schedule(self, workers=None, stats=None):
+        """Solve the trigger positions and execute the instructions on each port without writing the waveform
+        Args:
+            workers (int): number of threads executing the instructions
+            stats (CompileStats): stats the stages are recorded into
         """
-        
         ## initialize before compile
         self.trigger_index = 0
         self.trigger_position_list = None
@@ -190,8 +447,13 @@ class Sequence:
             port._reset()
 
         ## fix variables
-        for instruction, _ in self.instruction_list:
-            instruction._fix_variable()
+        with _measure(stats, "fix_variable"):
+            self.variable_port_dict = {}
+            for instruction, port in self.instruction_list:
+                instruction._fix_variable()
+                if not isinstance(instruction, Trigger):
+                    for variable in instruction.variables:
+                        self.variable_port_dict.setdefault(variable.name, set()).add(port.name)
 
         ## generate compiled instruction list
         self.compiled_instruction_list.append((Trigger(), self.port_list)) # start
@@ -199,52 +461,78 @@ class Sequence:
         self.compiled_instruction_list.append((Trigger(), self.port_list))
 
         ## append instructions on Ports
-        for instruction, port in self.compiled_instruction_list:
-            if isinstance(instruction, Trigger):
-                instruction.trigger_index = self.trigger_index
-                self.trigger_index += 1
-                for tmp_port in port:
-                    tmp_port._add(instruction)
-            else:
-                port._add(instruction)
+        with _measure(stats, "add"):
+            for instruction, port in self.compiled_instruction_list:
+                if isinstance(instruction, Trigger):
+                    instruction.trigger_index = self.trigger_index
+                    self.trigger_index += 1
+                    for tmp_port in port:
+                        tmp_port._add(instruction)
+                else:
+                    port._add(instruction)
 
         ## generage directed acylic graph
-        node_list = list(range(self.trigger_index))
-        weighted_edge_dict = {}
-        for port in self.port_list:
-            for (fnode, bnode, weight) in port._get_trigger_edge_list():
-                if (fnode, bnode) in weighted_edge_dict.keys():
-                    weighted_edge_dict[(fnode, bnode)] = max(weighted_edge_dict[(fnode, bnode)], weight)
-                else:
-                    weighted_edge_dict[(fnode, bnode)] = weight
-        weighted_edge_list = []
-        for (fnode, bnode), weight in weighted_edge_dict.items():
-            weighted_edge_list.append((fnode, bnode, weight))
+        with _measure(stats, "trigger_edge"):
+            node_list = list(range(self.trigger_index))
+            weighted_edge_dict = {}
+            for port in self.port_list:
+                for (fnode, bnode, weight) in port._get_trigger_edge_list():
+                    if (fnode, bnode) in weighted_edge_dict.keys():
+                        weighted_edge_dict[(fnode, bnode)] = max(weighted_edge_dict[(fnode, bnode)], weight)
+                    else:
+                        weighted_edge_dict[(fnode, bnode)] = weight
+            weighted_edge_list = []
+            for (fnode, bnode), weight in weighted_edge_dict.items():
+                weighted_edge_list.append((fnode, bnode, weight))
         
         ## solve weighted topological sort
-        self.trigger_position_list = weighted_topological_sort(node_list, weighted_edge_list)
+        with _measure(stats, "topological_sort"):
+            self.trigger_position_list = weighted_topological_sort(node_list, weighted_edge_list)
 
         ## syncronize trigger_position
-        for port in self.port_list:
-            port._sync_trigger_position(self.trigger_position_list)
+        with _measure(stats, "sync_trigger_position"):
+            for port in self.port_list:
+                port._sync_trigger_position(self.trigger_position_list)
             
-        ## reflect skew for each port
-        self.max_skew = max([port.skew for port in self.port_list])
-        for port in self.port_list:
-            port._sync_skew(self.max_skew - port.skew)
+            ## reflect skew for each port
+            self.max_skew = max([port.skew for port in self.port_list])
+            for port in self.port_list:
+                port._sync_skew(self.max_skew - port.skew)
 
         ## execute instructions
-        waveform_length = []
-        for port in self.port_list:
-            port._execute_instructions()
-            waveform_length.append(port.position)
-        self.max_waveform_lenght = max(waveform_length)
+        with _measure(stats, "execute_instructions"):
+            self._map_ports(lambda port: port._execute_instructions(), self.port_list, workers=workers)
+        self.max_waveform_lenght = max([port.position + port._get_filter_tail() for port in self.port_list])
 
-        ## write waveform
-        for port in self.port_list:
-            port._write_waveform(self.max_skew + self.max_waveform_lenght)
+    def iter_waveform(self, chunk_samples):
+        """Compile the instructions and yield the waveform chunk by chunk
 
-        self.flag["compiled"] = True
+        Only the pulses overlapping each chunk are rendered, so that the memory stays constant against the sequence length
+        and the first samples are available before the whole waveform is synthesized.
+        The concatenated chunks are identical to the waveform written by compile.
+        The waveforms are not stored in the Ports, and the next compile is done from scratch.
+
+        Args:
+            chunk_samples (int): number of samples of a chunk, the last chunk of each port may be shorter
+        Yields:
+            chunk_dict (dict): {port name : next chunk of the waveform}, a port is omitted after its last chunk
+        """
+        self.reset_compile()
+        self._schedule()
+        iterator_dict = {}
+        for port in self.port_list:
+            size = port._get_waveform_size(self.max_skew + self.max_waveform_lenght)
+            iterator_dict[port.name] = port._iter_waveform(size, chunk_samples)
+
+        while True:
+            chunk_dict = {}
+            for port_name, iterator in iterator_dict.items():
+                chunk = next(iterator, None)
+                if chunk is not None:
+                    chunk_dict[port_name] = chunk
+            if len(chunk_dict) == 0:
+                return
+            yield chunk_dict
 
     def draw(self, port_name_list=None, time_range=None, baseband=True, auto_yscale=False):
         """draw waveform saved in the Ports
@@ -253,6 +541,7 @@ class Sequence:
             time_range (tupple): time_range for plot written as (start, end)
             baseband (bool): whether to plot at baseband or at port.if_freq
         """
+        import matplotlib.pyplot as plt
 
         if not self.flag["compiled"]:
             self.compile()
@@ -277,10 +566,7 @@ class Sequence:
                 plt.axhline(0, color="black", linestyle="-")
                 for measurement_window in port.measurement_windows:
                     plt.axvspan(measurement_window[0], measurement_window[1], color="green", alpha=0.3)
-                if baseband:
-                    plot_waveform = np.exp(-1j*(2*np.pi*port.if_freq*port.time))*port.waveform
-                else:
-                    plot_waveform = port.waveform
+                plot_waveform = port._get_waveform(baseband)
                 plt.step(port.time, plot_waveform.real)
                 plt.step(port.time, plot_waveform.imag)
                 plt.fill_between(port.time, plot_waveform.real, step="pre", alpha=0.4)
@@ -307,25 +593,225 @@ class Sequence:
             plt.xlabel("Time (ns)")
             plt.show()
 
-    def get_waveform_information(self):
+    def _get_port_information(self, port, measurement_windows=None, dtype=None, interleave=False, marker=False, segment_table=False, segment_granularity=1, sparse=False):
+        """get waveform information of a single port
+        Args:
+            port (Port): compiled port
+            measurement_windows (list): measurement windows to be reported instead of those of the port
+            dtype, interleave, marker, segment_table, segment_granularity, sparse: output format (see get_waveform_information)
+        """
+        if measurement_windows is None:
+            measurement_windows = port.measurement_windows
+        port_information = {
+            "daq_length" : port.waveform_size*port.DAC_STEP,
+            "measurement_windows" : measurement_windows,
+            "waveform_updated" : False,
+        }
+        if port.mixing == "nco":
+            port_information["frame_table"] = port.frame_table
+        if marker:
+            port_information["marker"] = port._get_marker(measurement_windows)
+        if sparse:
+            port_information["waveform_size"] = port.waveform_size
+            port_information["segments"] = self._get_sparse_segments(port, dtype, interleave, port_information)
+            return port_information
+        port_information["waveform"] = port.waveform
+        if dtype is not None:
+            packed_marker = port_information.get("marker") if np.dtype(dtype) == np.int16 else None
+            waveform, clipping = port._convert_waveform(dtype, interleave, packed_marker)
+            port_information["waveform"] = waveform
+            port_information["clipping"] = clipping
+        if segment_table:
+            port_information["segment_table"] = port._get_segment_table(port_information.pop("waveform"), interleave, segment_granularity)
+        return port_information
+
+    def _get_sparse_segments(self, port, dtype, interleave, port_information):
+        """Convert the segments of the port into the output format
+        Returns:
+            segment_list (list): sorted list of (start index, samples)
+        """
+        if dtype is None:
+            return list(port._get_segments())
+        segment_list = []
+        clipping = {"peak" : 0.0, "clipped_samples" : 0}
+        for start, samples in port._get_segments():
+            samples, segment_clipping = port._convert_waveform(dtype, interleave, samples=samples)
+            segment_list.append((start, samples))
+            clipping["peak"] = max(clipping["peak"], segment_clipping["peak"])
+            clipping["clipped_samples"] += segment_clipping["clipped_samples"]
+        port_information["clipping"] = clipping
+        return segment_list
+
+    def get_waveform_information(self, dtype=None, interleave=False, marker=False, segment_table=False, segment_granularity=1, sparse=False, cache=False, keep_compile=False):
         """get waveform information for I/O with measurement_tools
+        Args:
+            dtype (np.dtype): output format of the waveform scaled by port.max_amp to the full scale (np.complex64, np.float32, or np.int16).
+                The complex128 waveform is returned as it is if None.
+            interleave (bool): return I and Q of the real dtype interleaved as [I0, Q0, I1, Q1, ...] instead of stacked as [[I...], [Q...]]
+            marker (bool): add the marker which is high during the measurement windows.
+                With np.int16, the waveform is quantized on 15 bits and the marker is packed into the least significant bit of I.
+            segment_table (bool): return "segment_table" instead of "waveform" for the sequencer-based AWGs,
+                with the library of the unique segments split at the pulse boundaries, the playlist of (start index, segment index, repeat),
+                and the compression ratio (see Port._get_segment_table). The samples between the segments are zero.
+                Since the segments are compared sample by sample, the quantized np.int16 output deduplicates best.
+            segment_granularity (int): number of samples the segment boundaries are aligned to
+            sparse (bool): return "segments", the sorted list of (start index, samples) covered by the pulses, and "waveform_size"
+                instead of "waveform", without materializing the dense waveform. The samples between the segments are zero.
+                ValueError is raised with segment_table, or with the marker packed into np.int16.
+            cache (bool or CompileCache): return the output of the identical sequence from the compile cache
+                (sequence_parser.cache.compile_cache if True), which survives reset_compile.
+                The sequence is identified by the instructions, the variable values and the port settings,
+                and the arrays are copied into and out of the cache. The instructions must not be modified after being added.
+            keep_compile (bool): keep the compiled state instead of calling reset_compile, so that the next call after update_variables
+                executes and writes only the ports depending on the updated variables. The ports keep their waveforms until reset_compile.
         """
+        output_format = {"dtype" : dtype, "interleave" : interleave, "marker" : marker, "segment_table" : segment_table, "segment_granularity" : segment_granularity, "sparse" : sparse}
+        _verify_output_format(output_format)
+        cache, fingerprint = self._get_cache_key(output_format, cache)
+        waveform_information = None if fingerprint is None else cache.get(fingerprint)
+        if waveform_information is not None:
+            if not keep_compile:
+                self.reset_compile()
+            return waveform_information
+
         if not self.flag["compiled"]:
             self.compile()
         
         waveform_information = {}
         for port in self.port_list:
-            waveform_information[port.name] = {
-                "daq_length" : port.waveform.size*port.DAC_STEP,
-                "measurement_windows" : port.measurement_windows,
-                "waveform" : port.waveform,
-                "waveform_updated" : False,
-            }
-            
-        self.reset_compile()
+            waveform_information[port.name] = self._get_port_information(port, **output_format)
             
+        if fingerprint is not None:
+            cache.put(fingerprint, waveform_information)
+        if not keep_compile:
+            self.reset_compile()
+
         return waveform_information
 
+    def _get_output_port_list(self):
+        """Ports whose settings change the output of get_waveform_information"""
+        return self.port_list
+
+    def _get_cache_key(self, output_format, cache):
+        """Fingerprint of the instructions, the resolved variable values, the port settings and the output format
+        Args:
+            output_format (dict): arguments of get_waveform_information
+            cache (bool or CompileCache): True for sequence_parser.cache.compile_cache, False not to use the cache
+        Returns:
+            (CompileCache, bytes): cache and fingerprint, where the fingerprint is None if the cache is not used
+                or some parameter cannot be fingerprinted (e.g. a user-defined function)
+        """
+        if cache is False or cache is None:
+            return None, None
+        if cache is True:
+            cache = compile_cache
+        dtype = output_format["dtype"]
+        output_key = {**output_format, "dtype" : None if dtype is None else np.dtype(dtype).str}
+        return cache, self.fingerprint_state.get_fingerprint(self.instruction_list, self.variable_dict, type(self).__name__, self._get_output_port_list(), output_key)
+
+    def compile_sweep(self, variables):
+        """Compile the sequence at every sweep point of the variables
+
+        The pulses are rendered after all the points are executed, where the points sharing a pulse
+        up to its amplitude and phase are written by a single rendering of it (see _compile_points).
+
+        Args:
+            variables (Variables): variables to be swept
+        Returns:
+            sweep_information (dict): {port_name : {"daq_length", "measurement_windows", "waveform"}},
+                where "waveform" is an array of shape (number of sweep points, number of samples) padded with zeros to a common length
+                and "measurement_windows" is the list of the measurement windows at each sweep point,
+                both in the canonical order of the sweep points regardless of the traversal order
+        """
+        if not hasattr(variables, "update_command_list"):
+            variables.compile()
+
+        try:
+            waveform_dict, window_dict = self._compile_points(variables.update_command_list)
+        finally:
+            self.reset_compile()
+
+        waveform_dict = {port_name : variables.to_canonical_order(waveform_list) for port_name, waveform_list in waveform_dict.items()}
+        window_dict = {port_name : variables.to_canonical_order(window_list) for port_name, window_list in window_dict.items()}
+        return _get_sweep_information(self.port_list, waveform_dict, window_dict)
+
+    def _compile_points(self, update_command_list):
+        """Compile the sweep points in the traversal order
+
+        The instructions are executed at each point, where only the ports depending on the updated variables are executed again.
+        The ports supporting Port._write_sweep are written at once after the last point, rendering each distinct pulse once
+        for all the points sharing its schedule and adding it with the amplitude and the phase of each point.
+        The other ports (e.g. with the filters, IQPort, or the "port" and "nco" mixing) are written at each point.
+
+        Args:
+            update_command_list (list): update commands of the sweep points
+        Returns:
+            (dict, dict): {port_name : list of the waveforms at each point} and {port_name : list of the measurement windows at each point}
+        """
+        template_dict = {port.name : {} for port in self.port_list}
+        size_dict = {port.name : 0 for port in self.port_list}
+        last_dict = {} # {port_name : (timeline, pulse list or waveform, measurement windows) of the last execution}
+        result_dict = {port.name : [] for port in self.port_list}
+        window_dict = {port.name : [] for port in self.port_list}
+        for update_command in update_command_list:
+            self.update_variables(update_command)
+            self.compile_stats = CompileStats() if self.stats_collector is not None else None
+            self._compile(None, None, self.compile_stats, write=False)
+            waveform_length = self.max_skew + self.max_waveform_lenght
+
+            # the ports not executed again keep their timeline and the result of the last point
+            executed_port_list = [port for port in self.port_list if port.name not in last_dict or last_dict[port.name][0] is not port.timeline]
+            write_port_list = []
+            for port in executed_port_list:
+                port.measurement_windows = []
+                if port._can_write_sweep():
+                    port._prepare_waveform()
+                    last_dict[port.name] = (port.timeline, port._get_sweep_pulses(template_dict[port.name]), port.measurement_windows)
+                else:
+                    write_port_list.append(port)
+            self._write_waveforms(write_port_list, [None]*len(write_port_list), stats=self.compile_stats)
+            for port in write_port_list:
+                last_dict[port.name] = (port.timeline, port.waveform, port.measurement_windows)
+
+            for port in self.port_list:
+                _, result, measurement_windows = last_dict[port.name]
+                result_dict[port.name].append(result)
+                window_dict[port.name].append(measurement_windows)
+                size_dict[port.name] = max(size_dict[port.name], port._get_waveform_size(waveform_length))
+            if self.compile_stats is not None:
+                self.compile_stats.compile_count = 1
+                self.stats_collector.merge(self.compile_stats)
+
+        stats = CompileStats() if self.stats_collector is not None else None
+        waveform_dict = {}
+        for port in self.port_list:
+            if not port._can_write_sweep():
+                waveform_dict[port.name] = result_dict[port.name]
+                continue
+            with _measure(stats, "write_waveform"):
+                waveform = port._write_sweep(template_dict[port.name], result_dict[port.name], size_dict[port.name])
+            waveform_dict[port.name] = list(waveform)
+            if stats is not None:
+                stats._add_sweep_port(port, result_dict[port.name], waveform)
+        if stats is not None:
+            self.stats_collector.merge(stats)
+        return waveform_dict, window_dict
+
+    def get_duration_variable_names(self):
+        """Names of the variables changing the durations of the instructions (e.g. Delay(duration) or FlatTop(top_duration)),
+        which move the trigger positions and force the full compile when updated.
+        They can be swept outermost by Variables.compile(outer=...).
+        Returns:
+            variable_name_list (list): names of the variables in the order of appearance
+        """
+        variable_name_list = []
+        for instruction, port in self.instruction_list:
+            if not isinstance(instruction, Trigger):
+                for variable_name in _get_duration_variable_names(instruction):
+                    if variable_name not in variable_name_list:
+                        variable_name_list.append(variable_name)
+        return variable_name_list
+
     def dump_setting(self):
         """Dump all settings as Dictionary
         
@@ -333,9 +819,14 @@ class Sequence:
             setting (dict): setting file of the Sequence
         """
         from .instruction.instruction_parser import parse
+        from .instruction.template import Template
 
         setting = []
         for instruction, port in self.instruction_list:
+            if isinstance(instruction, Template):
+                for inst in instruction.insts.values():
+                    setting.append({"instruction" : parse(inst), "port" : port.name})
+                continue
             inst_setting = parse(instruction)
 
             if isinstance(instruction, Trigger):
@@ -367,4 +858,4 @@ class Sequence:
                 self.trigger(port_list)
             else:
                 port = Port(name=port_setting)
-                self.add(instruction, port)
+                self.add(instruction, port, copy=False)
@@ -0,0 +1,119 @@
+import contextlib
+import time
+
+STAGE_LIST = [
+    "fix_variable",
+    "add",
+    "trigger_edge",
+    "topological_sort",
+    "sync_trigger_position",
+    "execute_instructions",
+    "write_waveform",
+]
+
+@contextlib.contextmanager
+def _measure(stats, stage):
+    """Add the wall time of the block to the stage of the stats, or do nothing if stats is None"""
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.stage_time[stage] += time.perf_counter() - start
+
+class CompileStats:
+    """Timing and memory of the compile stages
+
+    The stages are
+        fix_variable : Instruction._fix_variable
+        add : Port._add of the compiled instructions
+        trigger_edge : Port._get_trigger_edge_list
+        topological_sort : weighted topological sort of the triggers
+        sync_trigger_position : Port._sync_trigger_position and Port._sync_skew
+        execute_instructions : Port._execute_instructions
+        write_waveform : Port._write_waveform including the filters
+
+    The incremental compile only executes and writes the ports depending on the updated variables,
+    which appear in port_dict, and skips the topological sort.
+    """
+
+    def __init__(self):
+        self.compile_count = 0
+        self.stage_time = {stage : 0.0 for stage in STAGE_LIST} # s
+        self.port_dict = {} # {port_name : {"pulses", "samples", "bytes"}}, where "bytes" counts the segments of a sparse waveform
+        self.instruction_dict = {} # {instruction class name : (number of rendered pulses, render time in s)}
+
+    def _add_port(self, port, out=None):
+        """Count the pulses and the samples written on the port
+        Args:
+            port (Port): written port
+            out (np.ndarray): caller-provided buffer the waveform is written into, which is not counted as allocated
+        """
+        port_stats = self.port_dict.setdefault(port.name, {"pulses" : 0, "samples" : 0, "bytes" : 0})
+        port_stats["pulses"] += port._get_pulse_count()
+        port_stats["samples"] += port.waveform_size
+        if out is None:
+            port_stats["bytes"] += port._get_nbytes()
+        for name, (count, elapsed) in port.render_time_dict.items():
+            last_count, last_elapsed = self.instruction_dict.get(name, (0, 0.0))
+            self.instruction_dict[name] = (last_count + count, last_elapsed + elapsed)
+
+    def _add_sweep_port(self, port, pulse_list_list, waveform):
+        """Count the pulses and the samples of the sweep points written at once by Port._write_sweep
+        Args:
+            port (Port): written port
+            pulse_list_list (list): executed pulses at each sweep point
+            waveform (np.ndarray): waveforms of the sweep points
+        """
+        port_stats = self.port_dict.setdefault(port.name, {"pulses" : 0, "samples" : 0, "bytes" : 0})
+        port_stats["pulses"] += sum(len(pulse_list) for pulse_list in pulse_list_list)
+        port_stats["samples"] += waveform.size
+        port_stats["bytes"] += waveform.nbytes
+
+    def merge(self, stats):
+        """Accumulate the other stats
+        Args:
+            stats (CompileStats): stats of another compile
+        """
+        self.compile_count += stats.compile_count
+        for stage, elapsed in stats.stage_time.items():
+            self.stage_time[stage] += elapsed
+        for port_name, port_stats in stats.port_dict.items():
+            total = self.port_dict.setdefault(port_name, {"pulses" : 0, "samples" : 0, "bytes" : 0})
+            for key, value in port_stats.items():
+                total[key] += value
+        for name, (count, elapsed) in stats.instruction_dict.items():
+            last_count, last_elapsed = self.instruction_dict.get(name, (0, 0.0))
+            self.instruction_dict[name] = (last_count + count, last_elapsed + elapsed)
+
+    @property
+    def total_time(self):
+        return sum(self.stage_time.values())
+
+    def top_instructions(self, number=10):
+        """Returns:
+            instruction_list (list): (class name, number of rendered pulses, render time in s) in descending order of the render time
+        """
+        instruction_list = [(name, count, elapsed) for name, (count, elapsed) in self.instruction_dict.items()]
+        return sorted(instruction_list, key=lambda item: item[2], reverse=True)[:number]
+
+    def __repr__(self):
+        print_str = f"Compile Stats ({self.compile_count} compile)\n"
+        print_str += "-"*60 + "\n"
+        for stage, elapsed in self.stage_time.items():
+            print_str += f"  {stage}".ljust(30) + f"{elapsed*1e3:.3f} ms".rjust(16) + "\n"
+        print_str += f"  total".ljust(30) + f"{self.total_time*1e3:.3f} ms".rjust(16) + "\n"
+        print_str += "-"*60 + "\n"
+        print_str += "  Port".ljust(30) + "pulses".rjust(10) + "samples".rjust(12) + "bytes".rjust(14) + "\n"
+        for port_name, port_stats in self.port_dict.items():
+            print_str += f"  {port_name}".ljust(30) + f"{port_stats['pulses']}".rjust(10) + f"{port_stats['samples']}".rjust(12) + f"{port_stats['bytes']}".rjust(14) + "\n"
+        print_str += "-"*60 + "\n"
+        print_str += "  Instruction".ljust(30) + "pulses".rjust(10) + "render time".rjust(16) + "\n"
+        for name, count, elapsed in self.top_instructions():
+            print_str += f"  {name}".ljust(30) + f"{count}".rjust(10) + f"{elapsed*1e3:.3f} ms".rjust(16) + "\n"
+        return print_str
+
+    def __str__(self):
+        return self.__repr__()
@@ -1,40 +1,87 @@
-import networkx as nx
+from collections import deque
+
+def _build_adjacency(node_list, edge_list):
+    node_index = {node : index for index, node in enumerate(node_list)}
+    successor_list = [[] for _ in node_list]
+    in_degree = [0]*len(node_list)
+    for edge in edge_list:
+        fnode, bnode = node_index[edge[0]], node_index[edge[1]]
+        successor_list[fnode].append((bnode, edge[2] if len(edge) > 2 else None))
+        in_degree[bnode] += 1
+    return successor_list, in_degree
+
+def _sort_index(node_list, successor_list, in_degree):
+    in_degree = in_degree[:]
+    queue = deque(index for index, degree in enumerate(in_degree) if degree == 0)
+    sorted_index_list = []
+    while queue:
+        index = queue.popleft()
+        sorted_index_list.append(index)
+        for bnode, _ in successor_list[index]:
+            in_degree[bnode] -= 1
+            if in_degree[bnode] == 0:
+                queue.append(bnode)
+
+    if len(sorted_index_list) != len(node_list):
+        cycle_node_list = [node_list[index] for index in _get_cycle_index(successor_list, in_degree)]
+        raise Exception(f"triggers {cycle_node_list} form a cycle and cannot be ordered in time")
+    return sorted_index_list
+
+def _get_cycle_index(successor_list, in_degree):
+    """Indices of the nodes on the cycles, excluding the nodes only following them
+    Args:
+        in_degree (list): in-degrees left by _sort_index, which are positive on the cycles and the nodes following them
+    """
+    remaining = {index for index, degree in enumerate(in_degree) if degree > 0}
+    out_degree = {index : sum(bnode in remaining for bnode, _ in successor_list[index]) for index in remaining}
+    predecessor_dict = {index : [] for index in remaining}
+    for index in remaining:
+        for bnode, _ in successor_list[index]:
+            if bnode in remaining:
+                predecessor_dict[bnode].append(index)
+    queue = deque(index for index, degree in out_degree.items() if degree == 0)
+    while queue:
+        index = queue.popleft()
+        remaining.discard(index)
+        for fnode in predecessor_dict[index]:
+            out_degree[fnode] -= 1
+            if out_degree[fnode] == 0:
+                queue.append(fnode)
+    return sorted(remaining)
 
 def topological_sort(node_list, edge_list):
-    graph = nx.DiGraph()
-    graph.add_nodes_from(node_list)
-    graph.add_edges_from(edge_list)
-    sorted_node_list = list(nx.topological_sort(graph))
-    return sorted_node_list
+    """Sort the nodes of a directed acyclic graph
+    Args:
+        node_list (list): list of the nodes
+        edge_list (list): list of the edges written as (fnode, bnode)
+    Returns:
+        sorted_node_list (list): nodes ordered so that every edge points forward
+    """
+    successor_list, in_degree = _build_adjacency(node_list, edge_list)
+    sorted_index_list = _sort_index(node_list, successor_list, in_degree)
+    return [node_list[index] for index in sorted_index_list]
 
 def weighted_topological_sort(node_list, weighted_edge_list):
-    edge_list = [(fnode, bnode) for fnode, bnode, weight in weighted_edge_list]
-    sorted_node_list = topological_sort(node_list, edge_list)
+    """Evaluate the earliest position of each node with the longest path from the first node in O(V+E)
+    Args:
+        node_list (list): list of the trigger indices (0, 1, ..., N-1)
+        weighted_edge_list (list): list of the edges written as (fnode, bnode, minimum duration)
+    Returns:
+        node_pos (list): position of each node, or None if it is not reachable from the first node
+    """
+    successor_list, in_degree = _build_adjacency(node_list, weighted_edge_list)
+    sorted_index_list = _sort_index(node_list, successor_list, in_degree)
 
     node_pos = [None]*len(node_list)
-    head_node_list = [sorted_node_list[0]]
-    node_pos[sorted_node_list[0]] = 0
-    while len(head_node_list) >0:
-        head_node = head_node_list.pop(0)
-        head_pos = node_pos[head_node]
-        next_head_node_list = []
-        for fnode, bnode, weight in weighted_edge_list[:]:
-            if fnode == head_node:
-                next_head_node_list.append(bnode)
-                if node_pos[bnode] is None:
-                    node_pos[bnode] = head_pos + weight
-                else:
-                    node_pos[bnode] = max(head_pos + weight, node_pos[bnode])
-                weighted_edge_list.remove((fnode, bnode, weight))
-
-        for next_head_node in next_head_node_list:
-            flag = True
-            for fnode, bnode, weight in weighted_edge_list:
-                if bnode == next_head_node:
-                    flag = False
-            if flag:
-                if next_head_node not in head_node_list:
-                    head_node_list.append(next_head_node)
-        head_node_list.sort(key=sorted_node_list.index)
-
-    return node_pos
\ No newline at end of file
+    node_pos[sorted_index_list[0]] = 0
+    for index in sorted_index_list:
+        head_pos = node_pos[index]
+        if head_pos is None:
+            continue
+        for bnode, weight in successor_list[index]:
+            if node_pos[bnode] is None:
+                node_pos[bnode] = head_pos + weight
+            else:
+                node_pos[bnode] = max(head_pos + weight, node_pos[bnode])
+
+    return node_pos
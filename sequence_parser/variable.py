@@ -1,6 +1,13 @@
 import itertools
 import numpy as np
 
+# ufuncs returning booleans, whose Expression would be truthy regardless of the values
+_PREDICATE_UFUNC_SET = {
+    "equal", "not_equal", "less", "less_equal", "greater", "greater_equal",
+    "logical_and", "logical_or", "logical_xor", "logical_not",
+    "isfinite", "isinf", "isnan", "isnat", "signbit",
+}
+
 class Variable:
     def __init__(self, name, value_array, unit):
         self.name = name
@@ -15,8 +22,128 @@ class Variable:
         return f"Variable ({self.name})"
 
     def _set_value(self, idx):
+        self.index = idx
         self.value = self.value_array[idx]
 
+    @property
+    def variables(self):
+        """Source variables the value depends on"""
+        return [self]
+
+    def __add__(self, other):
+        return Expression("add", [self, other])
+
+    def __radd__(self, other):
+        return Expression("add", [other, self])
+
+    def __sub__(self, other):
+        return Expression("subtract", [self, other])
+
+    def __rsub__(self, other):
+        return Expression("subtract", [other, self])
+
+    def __mul__(self, other):
+        return Expression("multiply", [self, other])
+
+    def __rmul__(self, other):
+        return Expression("multiply", [other, self])
+
+    def __truediv__(self, other):
+        return Expression("true_divide", [self, other])
+
+    def __rtruediv__(self, other):
+        return Expression("true_divide", [other, self])
+
+    def __pow__(self, other):
+        return Expression("power", [self, other])
+
+    def __rpow__(self, other):
+        return Expression("power", [other, self])
+
+    def __neg__(self):
+        return Expression("negative", [self])
+
+    def __abs__(self):
+        return Expression("absolute", [self])
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        """Numpy ufuncs (e.g. np.exp(1j*phase)) applied on the variables return an Expression
+
+        The equality is the identity as for the other objects (e.g. np.float64(x) == variable is False),
+        and the other ufuncs returning booleans (e.g. np.less) raise TypeError.
+        """
+        if method != "__call__" or kwargs or ufunc.nout != 1:
+            return NotImplemented
+        if ufunc.__name__ in ("equal", "not_equal") and len(inputs) == 2:
+            return (inputs[0] is inputs[1]) == (ufunc.__name__ == "equal")
+        if ufunc.__name__ in _PREDICATE_UFUNC_SET:
+            return NotImplemented
+        return Expression(ufunc.__name__, list(inputs))
+
+
+class Expression(Variable):
+    """Variable derived from the other variables by the arithmetic operations and the numpy ufuncs
+
+    The expression is evaluated at once over the grid of the indices of the source variables,
+    and the value at a sweep point is looked up by the indices set by Sequence.update_variables.
+    The source variables are registered in the Sequence instead of the expression,
+    so that they are swept by Variables as usual.
+    """
+
+    def __init__(self, function, operand_list):
+        """
+        Args:
+            function (str): name of the numpy ufunc (e.g. "multiply", "exp")
+            operand_list (list): Variables, Expressions, or scalar constants
+        """
+        for operand in operand_list:
+            if not isinstance(operand, Variable) and np.ndim(operand) != 0:
+                raise Exception(f"operand of the variable expression must be Variable or scalar, not {type(operand).__name__}")
+        self.function = function
+        self.operand_list = operand_list
+        self.name = f"{function}({', '.join(operand.name if isinstance(operand, Variable) else str(operand) for operand in operand_list)})"
+        self.unit = ""
+        self.value_table = None
+
+        variable_name_list = []
+        self.variable_list = []
+        for operand in operand_list:
+            if isinstance(operand, Variable):
+                for variable in operand.variables:
+                    if variable.name not in variable_name_list:
+                        variable_name_list.append(variable.name)
+                        self.variable_list.append(variable)
+
+    @property
+    def variables(self):
+        return self.variable_list
+
+    def _set_value(self, idx):
+        raise Exception(f"{self.name} is derived from the other variables and cannot be set")
+
+    def _evaluate(self, axis_dict):
+        """Evaluate the expression broadcast over the indices of the source variables
+        Args:
+            axis_dict (dict): {variable_name : axis of the grid}
+        """
+        operand_list = []
+        for operand in self.operand_list:
+            if isinstance(operand, Expression):
+                operand = operand._evaluate(axis_dict)
+            elif isinstance(operand, Variable):
+                shape = [1]*len(axis_dict)
+                shape[axis_dict[operand.name]] = -1
+                operand = operand.value_array.reshape(shape)
+            operand_list.append(operand)
+        return getattr(np, self.function)(*operand_list)
+
+    @property
+    def value(self):
+        if self.value_table is None:
+            axis_dict = {variable.name : axis for axis, variable in enumerate(self.variable_list)}
+            self.value_table = self._evaluate(axis_dict)
+        return self.value_table[tuple(variable.index for variable in self.variable_list)]
+
 
 class Variables:
     def __init__(self, variable_list=None):
@@ -39,6 +166,8 @@ class Variables:
         tmp_var_name_list = []
         tmp_var_size_list = []
         for var in variable:
+            if isinstance(var, Expression):
+                raise Exception(f"{var.name} is derived from the other variables, which should be swept instead")
             if var.name in self.variable_name_list:
                 raise Exception(f"{var.name} is already used in the variable name")
             tmp_var_name_list.append(var.name)
@@ -59,20 +188,226 @@ class Variables:
         for variable in variables.variable_list:
             self.add(variable)
 
-    def compile(self):
+    def compile(self, order="raster", outer=None):
         """Compile the variables
-        
+
+        The update commands are evaluated lazily on access (see get_update_command).
+        The sweep points are indexed in the canonical order regardless of the traversal order,
+        where the results in the traversal order are mapped back by get_permutation or to_canonical_order.
+
+        Args:
+            order (str): traversal order of the sweep points
+                "raster" : the last axis changes fastest (canonical order)
+                "snake" : the last axis is swept back and forth (boustrophedon), so that it does not jump back at each row
+                "gray" : every axis is swept back and forth (reflected mixed-radix Gray code),
+                    so that only one axis moves by one step between successive points
+            outer (list): names of the variables whose axes are swept outermost in the given order
+                (e.g. Sequence.get_duration_variable_names(), which force the full compile when changed)
+        """
+        if order not in ["raster", "snake", "gray"]:
+            raise ValueError(f"order must be 'raster', 'snake', or 'gray', not {order}")
+        outer_axis_list = []
+        for variable_name in ([] if outer is None else outer):
+            axis = self._get_axis(variable_name)
+            if axis not in outer_axis_list:
+                outer_axis_list.append(axis)
+        self.order = order
+        self.axis_order = outer_axis_list + [axis for axis in range(len(self.variable_list)) if axis not in outer_axis_list]
+        self.update_command_list = _UpdateCommandList(self)
+
+    def _get_axis(self, variable_name):
+        for axis, variable in enumerate(self.variable_list):
+            if variable_name in [var.name for var in variable]:
+                return axis
+        raise Exception(f"{variable_name} is not included in the variables")
+
+    def _is_canonical(self):
+        return getattr(self, "order", "raster") == "raster" and getattr(self, "axis_order", None) in [None, list(range(len(self.variable_list)))]
+
+    @property
+    def shape(self):
+        """Shape of the sweep grid, where the zipped variables share an axis and the last axis changes fastest"""
+        return tuple(self.variable_size_list)
+
+    def __len__(self):
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    def __iter__(self):
+        """Yield the minimal update command of each sweep point in the traversal order"""
+        value_list = [[var.value_array.tolist() for var in variable] for variable in self.variable_list]
+        if self._is_canonical():
+            nd_index_iter = itertools.product(*[range(size) for size in self.shape])
+        else:
+            nd_index_iter = map(self._reflect, itertools.product(*[range(self.shape[axis]) for axis in self.axis_order]))
+        previous_nd_index = None
+        for nd_index in nd_index_iter:
+            yield self._get_update_command(nd_index, previous_nd_index, value_list)
+            previous_nd_index = nd_index
+
+    def _reflect(self, counter):
+        """Convert the loop counters of the axes in the traversal order into the index on each axis
+
+        An axis runs backward when the flat counter of its outer axes is odd,
+        for the last axis in the "snake" order and for every axis in the "gray" order.
+        """
+        nd_index = [0]*len(counter)
+        outer_count = 0
+        last_depth = len(counter) - 1
+        for depth, (axis, count) in enumerate(zip(self.axis_order, counter)):
+            size = self.shape[axis]
+            reflected = outer_count % 2 and (self.order == "gray" or (self.order == "snake" and depth == last_depth))
+            nd_index[axis] = size - 1 - count if reflected else count
+            outer_count = outer_count*size + count
+        return tuple(nd_index)
+
+    def get_sweep_index(self, position):
+        """Index on each axis of the sweep point visited at the position of the traversal order
+        Args:
+            position (int): position in the traversal order
+        Returns:
+            nd_index (tuple): index on each axis
+        """
+        size = len(self)
+        if not -size <= position < size:
+            raise IndexError(f"position {position} is out of the {size} sweep points")
+        position %= size
+        if self._is_canonical():
+            return self.get_index(position)
+        counter = []
+        for axis in reversed(self.axis_order):
+            position, count = divmod(position, self.shape[axis])
+            counter.append(count)
+        return self._reflect(tuple(reversed(counter)))
+
+    def get_permutation(self):
+        """Canonical flat index of the sweep point visited at each position of the traversal order
+        Returns:
+            permutation (np.ndarray): the results in the traversal order are mapped back as result[np.argsort(permutation)]
+        """
+        size = len(self)
+        if self._is_canonical():
+            return np.arange(size)
+        position = np.arange(size)
+        counter_list = []
+        for axis in reversed(self.axis_order):
+            position, count = np.divmod(position, self.shape[axis])
+            counter_list.append(count)
+        counter_list.reverse()
+        nd_index = [None]*len(self.shape)
+        outer_count = np.zeros(size, dtype=np.int64)
+        last_depth = len(counter_list) - 1
+        for depth, (axis, count) in enumerate(zip(self.axis_order, counter_list)):
+            axis_size = self.shape[axis]
+            if self.order == "gray" or (self.order == "snake" and depth == last_depth):
+                nd_index[axis] = np.where(outer_count % 2, axis_size - 1 - count, count)
+            else:
+                nd_index[axis] = count
+            outer_count = outer_count*axis_size + count
+        return np.ravel_multi_index(nd_index, self.shape)
+
+    def to_canonical_order(self, result):
+        """Reorder the results of the sweep points from the traversal order into the canonical order
+        Args:
+            result (np.ndarray or list): results in the traversal order along the first axis
+        Returns:
+            result (np.ndarray or list): results in the canonical order, which are reshaped into self.shape
         """
-        sweep_axis = [tuple(range(i)) for i in self.variable_size_list]
-        sweep_index = list(itertools.product(*sweep_axis))
-
-        self.update_command_list = []
-        tmp_var = dict(zip(self.variable_name_list, [None]*len(self.variable_name_list)))
-        for tmp_index in sweep_index:
-            update_command = {}
-            for variable, idx in zip(self.variable_list, tmp_index):
+        if self._is_canonical():
+            return result
+        inverse = np.argsort(self.get_permutation())
+        if isinstance(result, np.ndarray):
+            return result[inverse]
+        return [result[position] for position in inverse]
+
+    def get_index(self, index):
+        """Convert the flat index of a sweep point into the index on each axis
+        Args:
+            index (int or tuple): flat index, or the index on each axis
+        Returns:
+            nd_index (tuple): index on each axis
+        """
+        if isinstance(index, tuple):
+            if len(index) != len(self.shape):
+                raise IndexError(f"index {index} does not match the sweep shape {self.shape}")
+            for idx, size in zip(index, self.shape):
+                if not -size <= idx < size:
+                    raise IndexError(f"index {index} is out of the sweep shape {self.shape}")
+            return tuple(int(idx) % size for idx, size in zip(index, self.shape))
+        size = len(self)
+        if not -size <= index < size:
+            raise IndexError(f"index {index} is out of the {size} sweep points")
+        index %= size
+        nd_index = []
+        for axis_size in reversed(self.shape):
+            index, idx = divmod(index, axis_size)
+            nd_index.append(idx)
+        return tuple(reversed(nd_index))
+
+    def __getitem__(self, index):
+        """Full update command of a sweep point
+        Args:
+            index (int or tuple): flat index, or the index on each axis
+        Returns:
+            update_command (dict): {"variable_name" (str) : variable_index (int)} of all variables
+        """
+        update_command = {}
+        for variable, idx in zip(self.variable_list, self.get_index(index)):
+            for var in variable:
+                update_command[var.name] = idx
+        return update_command
+
+    def get_update_command(self, index, previous_index=None):
+        """Evaluate the minimal update command from a sweep point to another
+        Args:
+            index (int or tuple): flat index, or the index on each axis, of the next sweep point
+            previous_index (int or tuple): index of the current sweep point, or None for the first point
+        Returns:
+            update_command (dict): {"variable_name" (str) : variable_index (int)} of the variables whose values change
+        """
+        nd_index = self.get_index(index)
+        previous_nd_index = None if previous_index is None else self.get_index(previous_index)
+        value_list = [[var.value_array for var in variable] for variable in self.variable_list]
+        return self._get_update_command(nd_index, previous_nd_index, value_list)
+
+    def _get_update_command(self, nd_index, previous_nd_index, value_list):
+        """Args:
+            nd_index (tuple): index on each axis of the next sweep point
+            previous_nd_index (tuple): index on each axis of the current sweep point, or None for the first point
+            value_list (list): values of each variable grouped by the axis
+        """
+        update_command = {}
+        for axis, (variable, idx) in enumerate(zip(self.variable_list, nd_index)):
+            if previous_nd_index is None:
                 for var in variable:
-                    if tmp_var[var.name] != var.value_array[idx]:
-                        tmp_var[var.name] = var.value_array[idx]
-                        update_command[var.name] = idx
-            self.update_command_list.append(update_command)
+                    update_command[var.name] = idx
+                continue
+            previous_idx = previous_nd_index[axis]
+            if idx == previous_idx:
+                continue
+            for var, values in zip(variable, value_list[axis]):
+                if values[previous_idx] != values[idx]:
+                    update_command[var.name] = idx
+        return update_command
+
+
+class _UpdateCommandList:
+    """Lazy list of the minimal update commands of the sweep points in the traversal order"""
+
+    def __init__(self, variables):
+        self.variables = variables
+
+    def __len__(self):
+        return len(self.variables)
+
+    def __iter__(self):
+        return iter(self.variables)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[idx] for idx in range(*index.indices(len(self)))]
+        size = len(self)
+        if not -size <= index < size:
+            raise IndexError(f"index {index} is out of the {size} sweep points")
+        index %= size
+        previous_index = self.variables.get_sweep_index(index - 1) if index > 0 else None
+        return self.variables.get_update_command(self.variables.get_sweep_index(index), previous_index)
@@ -6,6 +6,5 @@ setup(
     install_requires=[
         "numpy",
         "matplotlib",
-        "networkx",
     ]
 )
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.instruction import Gaussian
+
+@pytest.fixture
+def build_sequence():
+    """Factory of a sequence of a Gaussian pulse on the port Q0 followed by the instructions on Q0"""
+    def build(amplitude=0.5, *inst_list):
+        port = Port("Q0", if_freq=0.1)
+        seq = Sequence()
+        seq.add(Gaussian(amplitude=amplitude, fwhm=10, duration=40), port)
+        for inst in inst_list:
+            seq.add(inst, port)
+        return seq
+    return build
+
+@pytest.fixture
+def get_peak():
+    """Maximum magnitude of the waveform of the port in the output of get_waveform_information"""
+    def peak(waveform_information, port_name="Q0"):
+        return np.abs(waveform_information[port_name]["waveform"]).max()
+    return peak
+
+@pytest.fixture
+def get_waveforms():
+    """Compile the sequence and copy the waveform of each port"""
+    def compile(seq, **kwargs):
+        seq.compile(**kwargs)
+        return {port.name : port.waveform.copy() for port in seq.port_list}
+    return compile
+
+@pytest.fixture
+def spy(monkeypatch):
+    """Record the instances on which the method of the class is called"""
+    def patch(cls, name, condition=None):
+        called = []
+        method = getattr(cls, name)
+        def wrapper(self, *args, **kwargs):
+            if condition is None or condition(self, *args, **kwargs):
+                called.append(self)
+            return method(self, *args, **kwargs)
+        monkeypatch.setattr(cls, name, wrapper)
+        return called
+    return patch
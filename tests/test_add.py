@@ -0,0 +1,23 @@
+import numpy as np
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.instruction import Gaussian, Square
+from sequence_parser.instruction.functional import Union
+
+def test_add_copies_instruction(get_peak):
+    pulse = Gaussian(amplitude=0.5, fwhm=10, duration=40)
+    seq = Sequence()
+    seq.add(pulse, Port("Q0"))
+    pulse.params["amplitude"] = 0.9
+    assert np.isclose(get_peak(seq.get_waveform_information()), 0.5)
+
+def test_add_shares_instruction():
+    pulse = Gaussian(amplitude=0.5, fwhm=10, duration=40)
+    seq = Sequence()
+    seq.add(pulse, Port("Q0"), copy=False)
+    assert seq.instruction_list[0][0] is pulse
+
+def test_union_children_are_written(get_peak):
+    seq = Sequence()
+    seq.add(Union([Square(amplitude=0.3, duration=20), Square(amplitude=0.4, duration=40)]), Port("Q0"))
+    assert np.isclose(get_peak(seq.get_waveform_information()), 0.7)
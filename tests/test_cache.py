@@ -0,0 +1,68 @@
+import os
+import numpy as np
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.variable import Variable
+from sequence_parser.cache import CompileCache, compile_cache
+from sequence_parser.instruction import Gaussian
+from sequence_parser.instruction.pulse.pulse import CRAB
+
+def build_crab_sequence(coefficients, polynominals=([0, 1], [0, 0, 1])):
+    seq = Sequence()
+    seq.add(CRAB(Gaussian(amplitude=0.5, fwhm=10, duration=40), coefficients, polynominals), Port("Q0", if_freq=0.1))
+    return seq
+
+def test_cache_copies_caller_buffer(build_sequence, get_peak):
+    cache = CompileCache()
+    buffer = np.zeros(1000, dtype=np.complex128)
+    out = lambda port_name, size: buffer
+    seq = build_sequence(0.5)
+    seq.compile(out=out)
+    assert np.isclose(get_peak(seq.get_waveform_information(cache=cache)), 0.5)
+    # the caller reuses the buffer for another sequence
+    other = build_sequence(0.9)
+    other.compile(out=out)
+    assert np.isclose(get_peak(build_sequence(0.5).get_waveform_information(cache=cache)), 0.5)
+    assert cache.hits == 1
+
+def test_cache_copies_memmap(tmp_path, build_sequence, get_peak):
+    cache = CompileCache()
+    amplitude = Variable("amplitude", [0.3, 0.7], "")
+    seq = build_sequence(amplitude)
+    seq.update_variables({"amplitude" : 0})
+    seq.compile(out=str(tmp_path))
+    assert np.isclose(get_peak(seq.get_waveform_information(cache=cache)), 0.3)
+    # the memmap file is written again by the next sweep point
+    seq.update_variables({"amplitude" : 1})
+    seq.compile(out=str(tmp_path))
+    assert np.isclose(np.abs(np.load(os.path.join(str(tmp_path), "Q0.npy"))).max(), 0.7)
+    seq.update_variables({"amplitude" : 0})
+    assert np.isclose(get_peak(seq.get_waveform_information(cache=cache)), 0.3)
+    assert cache.hits == 1
+
+def test_cache_returns_own_arrays(build_sequence, get_peak):
+    cache = CompileCache()
+    first = build_sequence(0.5).get_waveform_information(cache=cache)
+    second = build_sequence(0.5).get_waveform_information(cache=cache)
+    second["Q0"]["waveform"] *= 2
+    third = build_sequence(0.5).get_waveform_information(cache=cache)
+    assert cache.hits == 2
+    assert np.isclose(get_peak(first), 0.5)
+    assert np.isclose(get_peak(third), 0.5)
+
+def test_cache_is_opt_in(build_sequence):
+    seq = build_sequence(0.5)
+    assert seq._get_cache_key({"dtype" : None}, False) == (None, None)
+    hits, misses = compile_cache.hits, compile_cache.misses
+    seq.get_waveform_information()
+    assert (compile_cache.hits, compile_cache.misses) == (hits, misses)
+
+def test_cache_distinguishes_crab_coefficients():
+    first = build_crab_sequence([1, 0]).get_waveform_information(cache=True)
+    second = build_crab_sequence([0, 1]).get_waveform_information(cache=True)
+    assert not np.allclose(first["Q0"]["waveform"], second["Q0"]["waveform"])
+    assert np.allclose(build_crab_sequence([0, 1]).get_waveform_information()["Q0"]["waveform"], second["Q0"]["waveform"])
+
+def test_cache_skips_user_defined_functions():
+    seq = build_crab_sequence([1], [lambda time: time])
+    assert seq._get_cache_key({"dtype" : None}, True)[1] is None
@@ -0,0 +1,58 @@
+import os
+import numpy as np
+import pytest
+from sequence_parser.port import Port
+from sequence_parser.variable import Variable
+from sequence_parser.instruction import Gaussian, Delay
+
+@pytest.fixture
+def seq(build_sequence):
+    seq = build_sequence(Variable("amplitude", [0.3, 0.7], ""), Delay(20))
+    seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=40), Port("Q1", if_freq=0.1))
+    return seq
+
+def test_recompile_into_equal_directory(tmp_path, seq):
+    seq.update_variables({"amplitude" : 0})
+    seq.compile(out=os.path.join(str(tmp_path), ""))
+    seq.update_variables({"amplitude" : 1})
+    # an equal path built again is the same output, so that the incremental compile skips the topological sort
+    seq.compile(out=os.path.join(str(tmp_path), "."), stats=True)
+    assert seq.compile_stats.stage_time["topological_sort"] == 0
+    assert list(seq.compile_stats.port_dict) == ["Q0"]
+    waveform = np.load(os.path.join(str(tmp_path), "Q0.npy"))
+    assert np.isclose(np.abs(waveform).max(), 0.7)
+
+def test_recompile_into_other_directory(tmp_path, seq):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    seq.update_variables({"amplitude" : 0})
+    seq.compile(out=str(tmp_path / "a"))
+    seq.update_variables({"amplitude" : 1})
+    seq.compile(out=str(tmp_path / "b"), stats=True)
+    assert seq.compile_stats.stage_time["topological_sort"] > 0
+    assert sorted(os.listdir(tmp_path / "b")) == ["Q0.npy", "Q1.npy"]
+
+def test_get_waveform_information_keep_compile(seq, get_peak):
+    seq.update_variables({"amplitude" : 0})
+    first = seq.get_waveform_information(cache=False, keep_compile=True)
+    seq.update_variables({"amplitude" : 1})
+    with seq.collect_stats() as stats:
+        second = seq.get_waveform_information(cache=False, keep_compile=True)
+    # only the port depending on the updated variable is written again
+    assert stats.stage_time["topological_sort"] == 0
+    assert list(stats.port_dict) == ["Q0"]
+    assert np.isclose(get_peak(first), 0.3)
+    assert np.isclose(get_peak(second), 0.7)
+    assert np.allclose(first["Q1"]["waveform"], second["Q1"]["waveform"])
+
+@pytest.mark.parametrize("name, value", [("mixing", "nco"), ("max_amp", 0.5), ("skew_delay", 2.0)])
+def test_port_setting_forces_full_compile(seq, get_waveforms, name, value):
+    seq.update_variables({"amplitude" : 0})
+    seq.compile()
+    seq.update_variables({"amplitude" : 1})
+    setattr(seq.port_list[0], name, value)
+    seq.compile(stats=True)
+    assert seq.compile_stats.stage_time["topological_sort"] > 0
+    waveform = seq.port_list[0].waveform.copy()
+    seq.reset_compile()
+    assert np.array_equal(get_waveforms(seq)["Q0"], waveform)
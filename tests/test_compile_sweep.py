@@ -0,0 +1,46 @@
+import numpy as np
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.variable import Variable, Variables
+from sequence_parser.filter import FIRFilter
+from sequence_parser.instruction import Gaussian, Deriviative, VirtualZ, Delay
+from sequence_parser.instruction.pulse.pulse import Pulse
+
+def build_sweep():
+    amplitude = Variable("amplitude", np.linspace(0, 1, 11), "")
+    phase = Variable("phase", np.linspace(0, np.pi, 3), "rad")
+    delay = Variable("delay", [0, 10.3], "ns")
+    variables = Variables()
+    variables.add(delay)
+    variables.add(phase)
+    variables.add(amplitude)
+    variables.compile()
+    filtered = Port("F0", if_freq=0.1)
+    filtered.add_filter(FIRFilter(np.ones(4)/4))
+    seq = Sequence()
+    for port in [Port("Q0", if_freq=0.11), filtered]:
+        seq.add(Gaussian(amplitude=amplitude, fwhm=10, duration=40), port)
+        seq.add(VirtualZ(phase), port)
+        seq.add(Deriviative(Gaussian(amplitude=0.3*amplitude, fwhm=10, duration=40)), port)
+        seq.add(Delay(delay), port)
+        seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=40), port)
+    return seq, variables
+
+def test_compile_sweep_matches_compile():
+    seq, variables = build_sweep()
+    sweep_information = seq.compile_sweep(variables)
+    for index, update_command in enumerate(variables.update_command_list):
+        seq.update_variables(update_command)
+        seq.compile()
+        for port in seq.port_list:
+            waveform = sweep_information[port.name]["waveform"][index]
+            assert np.allclose(waveform[:port.waveform.size], port.waveform, rtol=0, atol=1e-12)
+            assert not np.any(waveform[port.waveform.size:])
+
+def test_compile_sweep_renders_shared_pulses_once(spy):
+    seq, variables = build_sweep()
+    rendered = spy(Pulse, "_write", lambda self, port, *args, **kwargs: port.name == "Q0")
+    seq.compile_sweep(variables)
+    # the swept amplitudes and phases are applied to a single rendering of each pulse,
+    # where the last pulse is rendered at each delay
+    assert len(rendered) == 2 + 2
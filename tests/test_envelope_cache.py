@@ -0,0 +1,76 @@
+import threading
+import numpy as np
+from sequence_parser.instruction.pulse.pulse_shape import EnvelopeCache, PulseShape
+
+class RampShape(PulseShape):
+    def __init__(self, slope):
+        super().__init__()
+        self.slope = slope
+
+    def model_func(self, time):
+        return self.slope*time + 0j
+
+class StepShape(RampShape):
+    def model_func(self, time):
+        return self.slope*np.sign(time) + 0j
+
+def get_time(size, offset=0):
+    return np.arange(size) - size/2 + offset
+
+def test_envelope_cache_counts_hits_and_misses():
+    cache = EnvelopeCache()
+    envelope = cache.get(RampShape(0.5), get_time(8))
+    assert np.array_equal(envelope, 0.5*get_time(8))
+    assert not envelope.flags.writeable
+    assert cache.get(RampShape(0.5), get_time(8)) is envelope
+    # another parameter or time grid is another envelope
+    cache.get(RampShape(0.7), get_time(8))
+    cache.get(RampShape(0.5), get_time(8, offset=0.25))
+    assert cache.info() == {"hits" : 1, "misses" : 3, "evictions" : 0, "size" : 3, "nbytes" : 3*8*16}
+
+def test_envelope_cache_evicts_least_recently_used():
+    cache = EnvelopeCache(maxsize=2)
+    first = cache.get(RampShape(0.1), get_time(8))
+    cache.get(RampShape(0.2), get_time(8))
+    assert cache.get(RampShape(0.1), get_time(8)) is first
+    cache.get(RampShape(0.3), get_time(8))
+    assert cache.info()["evictions"] == 1
+    assert cache.get(RampShape(0.1), get_time(8)) is first
+    assert cache.get(RampShape(0.2), get_time(8)) is not None
+    assert cache.info()["misses"] == 4
+
+def test_envelope_cache_evicts_by_bytes():
+    cache = EnvelopeCache(max_bytes=3*8*16)
+    for slope in range(4):
+        cache.get(RampShape(slope), get_time(8))
+    assert cache.info()["size"] == 3
+    assert cache.info()["evictions"] == 1
+    # an envelope larger than the limit is returned without being cached
+    cache.get(RampShape(0.5), get_time(100))
+    assert cache.info()["size"] == 3
+
+def test_envelope_cache_invalidate_shape_class():
+    cache = EnvelopeCache()
+    cache.get(RampShape(0.5), get_time(8))
+    cache.get(StepShape(0.5), get_time(8))
+    cache.invalidate(StepShape)
+    assert cache.info()["size"] == 1
+    assert cache.info()["nbytes"] == 8*16
+    cache.get(RampShape(0.5), get_time(8))
+    assert cache.info()["hits"] == 1
+    cache.invalidate()
+    assert cache.info()["size"] == 0
+    assert cache.info()["nbytes"] == 0
+
+def test_envelope_cache_clear_waits_for_lock():
+    cache = EnvelopeCache()
+    cache.get(RampShape(0.5), get_time(8))
+    # a port writing concurrently holds the lock
+    with cache.lock:
+        thread = threading.Thread(target=cache.clear)
+        thread.start()
+        thread.join(0.1)
+        assert thread.is_alive()
+        assert cache.info()["size"] == 1
+    thread.join()
+    assert cache.info() == {"hits" : 0, "misses" : 0, "evictions" : 0, "size" : 0, "nbytes" : 0}
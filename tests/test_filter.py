@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.filter import FIRFilter, IIRFilter
+from sequence_parser.instruction import Gaussian, VirtualZ, Delay
+
+signal = pytest.importorskip("scipy.signal")
+
+def cable(n_taps, block_size):
+    taps = np.exp(-np.arange(n_taps)/(n_taps/5))
+    return FIRFilter(taps/np.sum(taps), block_size=block_size)
+
+# the small blocks split the pulses, so that the state is carried across the blocks
+FILTER_LIST_DICT = {
+    "fir" : lambda: [cable(50, block_size=64)],
+    "fir_default_block" : lambda: [cable(50, block_size=None)],
+    "iir_bias_tee" : lambda: [IIRFilter([1, -0.99], [1, -1], tail=30, block_size=16)],
+    "iir4" : lambda: [IIRFilter([0.2, 0.1, 0.05, 0.02, 0.01], [1, -0.5, 0.2, -0.1, 0.05], tail=20, block_size=32)],
+    "iir_then_fir" : lambda: [IIRFilter([1, -0.99], [1, -1], tail=10, block_size=16), cable(20, block_size=64)],
+}
+
+def build_sequence(filter_list, tail=0):
+    port = Port("Q0", if_freq=0.1)
+    for filter in filter_list:
+        port.add_filter(filter)
+    seq = Sequence()
+    for _ in range(5):
+        seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=40), port)
+        seq.add(VirtualZ(0.3), port)
+        seq.add(Delay(30.5), port)
+    if tail > 0:
+        seq.add(Delay(tail), port)
+    return seq
+
+def get_reference(filter_list, get_waveforms):
+    """Unfiltered waveform extended by the tails and filtered by numpy and scipy"""
+    tail = sum(filter.tail for filter in filter_list)*Port("Q0").DAC_STEP
+    waveform = get_waveforms(build_sequence([], tail))["Q0"]
+    for filter in filter_list:
+        if isinstance(filter, FIRFilter):
+            waveform = np.convolve(waveform, filter.taps)[:waveform.size]
+        else:
+            waveform = signal.lfilter(filter.b, filter.a, waveform)
+    return waveform
+
+@pytest.mark.parametrize("label", FILTER_LIST_DICT)
+def test_filter_matches_reference(label, get_waveforms):
+    filter_list = FILTER_LIST_DICT[label]()
+    waveform = get_waveforms(build_sequence(filter_list))["Q0"]
+    reference = get_reference(filter_list, get_waveforms)
+    assert waveform.size == reference.size
+    assert np.allclose(waveform, reference, rtol=0, atol=1e-12)
+
+@pytest.mark.parametrize("label", FILTER_LIST_DICT)
+@pytest.mark.parametrize("chunk_samples", [1, 7, 16, 100, 10000])
+def test_filter_chunks_match_compile(label, chunk_samples, get_waveforms):
+    seq = build_sequence(FILTER_LIST_DICT[label]())
+    waveform = get_waveforms(seq)["Q0"]
+    chunk_list = [chunk_dict["Q0"] for chunk_dict in seq.iter_waveform(chunk_samples)]
+    assert all(chunk.size == chunk_samples for chunk in chunk_list[:-1])
+    assert np.array_equal(np.concatenate(chunk_list), waveform)
+
+def test_filter_apply_matches_lfilter():
+    rng = np.random.default_rng(0)
+    waveform = rng.normal(size=1000) + 1j*rng.normal(size=1000)
+    filter = IIRFilter([0.2, 0.1, 0.05], [2, -0.5, 0.2], block_size=64)
+    assert np.allclose(filter.apply(waveform), signal.lfilter([0.2, 0.1, 0.05], [2, -0.5, 0.2], waveform), rtol=0, atol=1e-12)
@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+import pytest
+
+LAZY_MODULES = ["matplotlib", "networkx", "scipy", "cirq", "qupy"]
+
+SCRIPT = f"""
+import importlib, sys
+importlib.import_module(sys.argv[1])
+print(",".join(name for name in {LAZY_MODULES!r} if name in sys.modules))
+"""
+
+@pytest.mark.parametrize("module", ["sequence_parser.sequence", "sequence_parser.circuit"])
+def test_heavy_modules_are_imported_lazily(module):
+    # a fresh interpreter, since the other tests may have imported them
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    stdout = subprocess.run([sys.executable, "-c", SCRIPT, module], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert stdout.strip() == ""
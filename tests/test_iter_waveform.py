@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.variable import Variable
+from sequence_parser.circuit import Circuit
+from sequence_parser.util.test_backend import backend
+from sequence_parser.instruction import Gaussian, Square, VirtualZ, Delay
+
+def build_sequence():
+    amplitude = Variable("amplitude", [0.2, 0.6], "")
+    skewed = Port("Q1", if_freq=0.13)
+    skewed.skew = 3.5
+    nco = Port("Q2", if_freq=0.07)
+    nco.mixing = "nco"
+    seq = Sequence()
+    for index in range(20):
+        for port in [Port("Q0", if_freq=0.1), skewed, nco]:
+            seq.add(Gaussian(amplitude=amplitude, fwhm=10, duration=40), port)
+            seq.add(VirtualZ(0.3*index), port)
+            seq.add(Delay(17.3), port)
+        seq.add(Square(amplitude=0.1, duration=100), Port("Q0"))
+    seq.update_variables({"amplitude" : 1})
+    return seq
+
+def build_circuit():
+    cir = Circuit(backend)
+    for node in [1, 2, 3]:
+        cir.rx90(node)
+        cir.rz(0.7, node)
+    cir.rzx45(1, 2)
+    cir.measurement_all()
+    return cir
+
+@pytest.mark.parametrize("build", [build_sequence, build_circuit])
+@pytest.mark.parametrize("chunk_samples", [1, 37, 256, 10**6])
+def test_iter_waveform_matches_compile(build, chunk_samples, get_waveforms):
+    seq = build()
+    waveform_dict = get_waveforms(seq)
+    chunk_list_dict = {}
+    for chunk_dict in seq.iter_waveform(chunk_samples):
+        for port_name, chunk in chunk_dict.items():
+            chunk_list_dict.setdefault(port_name, []).append(chunk)
+    assert chunk_list_dict.keys() == waveform_dict.keys()
+    for port_name, chunk_list in chunk_list_dict.items():
+        assert all(chunk.size == chunk_samples for chunk in chunk_list[:-1])
+        assert np.array_equal(np.concatenate(chunk_list), waveform_dict[port_name]), port_name
@@ -0,0 +1,43 @@
+import numpy as np
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.instruction import Gaussian, Square, VirtualZ, Delay
+from sequence_parser.instruction.pulse.pulse import Pulse
+
+def compile_both(build, get_waveforms):
+    waveform = get_waveforms(build())
+    seq = build()
+    for port in seq.port_list:
+        port.mixing = "nco"
+    seq.compile()
+    return seq, waveform
+
+def test_nco_fast_path_after_virtual_z(spy, get_waveforms):
+    count = spy(Pulse, "_write_baseband")
+    def build():
+        port = Port("Q0", if_freq=0.11)
+        seq = Sequence()
+        seq.add(Delay(10.3), port)
+        seq.add(VirtualZ(0.7), port)
+        seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=40), port)
+        return seq
+    seq, waveform = compile_both(build, get_waveforms)
+    assert len(count) == 1
+    port = seq.port_list[0]
+    assert np.allclose(port._get_waveform(), waveform[port.name])
+
+def test_nco_fast_path_back_to_back(spy, get_waveforms):
+    count = spy(Pulse, "_write_baseband")
+    def build():
+        port = Port("Q0", if_freq=0.11)
+        seq = Sequence()
+        seq.add(Square(amplitude=0.3, duration=20.6), port)
+        seq.add(VirtualZ(0.7), port)
+        seq.add(Square(amplitude=0.4, duration=20), port)
+        seq.add(VirtualZ(-0.3), port)
+        seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=40), port)
+        return seq
+    seq, waveform = compile_both(build, get_waveforms)
+    assert len(count) == 3
+    port = seq.port_list[0]
+    assert np.allclose(port._get_waveform(), waveform[port.name])
@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+from sequence_parser.instruction import Acquire
+
+@pytest.mark.parametrize("output_format", [
+    {"sparse" : True, "segment_table" : True},
+    {"sparse" : True, "segment_table" : True, "dtype" : np.int16},
+    {"sparse" : True, "marker" : True, "dtype" : np.int16},
+])
+def test_sparse_rejects_incompatible_options(output_format, build_sequence):
+    with pytest.raises(ValueError):
+        build_sequence(0.5, Acquire(duration=100)).get_waveform_information(**output_format)
+
+def test_sparse_with_marker(build_sequence):
+    port_information = build_sequence(0.5, Acquire(duration=100)).get_waveform_information(dtype=np.float32, marker=True, sparse=True)["Q0"]
+    assert port_information["marker"].size == port_information["waveform_size"]
+    assert np.any(port_information["marker"])
@@ -0,0 +1,38 @@
+import sys
+import numpy as np
+import pytest
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.instruction import Gaussian, Delay, VirtualZ
+
+def build_detuning_sequence(n_ports=8):
+    seq = Sequence()
+    port_list = [Port(f"Q{index}", if_freq=0.1) for index in range(n_ports)]
+    for index, port in enumerate(port_list):
+        # the detuning blocks start at different positions on each port
+        seq.add(Delay(10*index), port)
+        for repeat in range(10):
+            with seq.detuning(port, 0.001*(index + 1)):
+                seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=40), port)
+                seq.add(VirtualZ(0.1*index), port)
+                seq.add(Delay(5*(index + repeat)), port)
+    seq.trigger(port_list)
+    for port in port_list:
+        seq.add(Gaussian(amplitude=0.5, fwhm=10, duration=40), port)
+    return seq
+
+@pytest.fixture
+def fast_switch():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+def test_workers_match_serial(fast_switch, get_waveforms):
+    seq = build_detuning_sequence()
+    reference = get_waveforms(seq)
+    for _ in range(20):
+        seq.reset_compile()
+        seq.compile(workers=8)
+        for port in seq.port_list:
+            assert np.array_equal(port.waveform, reference[port.name]), port.name
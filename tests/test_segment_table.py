@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.instruction import Square, Gaussian, Delay
+
+def build_sequence():
+    seq = Sequence()
+    port = Port("Q0")
+    for _ in range(4):
+        seq.add(Square(amplitude=0.5, duration=16), port)
+    seq.add(Delay(30), port)
+    seq.add(Gaussian(amplitude=0.5, fwhm=5, duration=20), port)
+    seq.add(Delay(7.3), port)
+    seq.add(Gaussian(amplitude=0.3, fwhm=5, duration=20), port)
+    seq.add(Square(amplitude=0.2, duration=5), Port("Q1", if_freq=0.1))
+    return seq
+
+def rebuild(segment_table, waveform, interleave):
+    """Dense waveform of the shape and dtype of the waveform played from the segment table"""
+    rebuilt = np.zeros_like(waveform)
+    for start, index, repeat in segment_table["playlist"]:
+        segment = segment_table["library"][index]
+        size = segment.shape[-1]//2 if interleave else segment.shape[-1]
+        for count in range(repeat):
+            position = start + count*size
+            if interleave:
+                rebuilt[2*position:2*(position + size)] = segment
+            else:
+                rebuilt[..., position:position + size] = segment
+    return rebuilt
+
+@pytest.mark.parametrize("output_format", [
+    {},
+    {"dtype" : np.int16},
+    {"dtype" : np.int16, "interleave" : True},
+    {"dtype" : np.float32, "segment_granularity" : 16},
+    {"dtype" : np.int16, "interleave" : True, "segment_granularity" : 8},
+])
+def test_segment_table_rebuilds_waveform(output_format):
+    granularity = output_format.pop("segment_granularity", 1)
+    dense = build_sequence().get_waveform_information(**output_format)
+    table = build_sequence().get_waveform_information(segment_table=True, segment_granularity=granularity, **output_format)
+    for port_name, port_information in dense.items():
+        segment_table = table[port_name]["segment_table"]
+        waveform = port_information["waveform"]
+        assert np.array_equal(rebuild(segment_table, waveform, output_format.get("interleave", False)), waveform), port_name
+        assert all(start % granularity == 0 for start, _, _ in segment_table["playlist"])
+
+def test_segment_table_deduplicates_repeated_pulses():
+    segment_table = build_sequence().get_waveform_information(dtype=np.int16, segment_table=True)["Q0"]["segment_table"]
+    # the 4 identical square pulses are played as a single segment repeated back to back
+    assert segment_table["playlist"][0] == (0, 0, 4)
+    assert segment_table["compression_ratio"] > 1
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from sequence_parser.circuit import Circuit
+from sequence_parser.util.test_backend import backend
+from sequence_parser.instruction.template import Template
+
+def build_circuit(use_template, prepare=None):
+    """Clifford-like layers on util/test_backend, with the instructions added by prepare before them"""
+    cir = Circuit(backend, use_template)
+    if prepare is not None:
+        prepare(cir)
+    for layer in range(4):
+        for node in [1, 2, 3]:
+            cir.rx90(node)
+            cir.rz(0.3*(layer + node), node)
+            cir.rx90(node)
+        cir.rzx45(1 + layer % 2, 2 + layer % 2)
+        cir.qtrigger([1, 2, 3])
+    cir.measurement_all()
+    return cir
+
+def compile_both(get_waveforms, prepare=None):
+    expanded = get_waveforms(build_circuit(False, prepare))
+    templated = get_waveforms(build_circuit(True, prepare))
+    assert expanded.keys() == templated.keys()
+    for port_name in expanded:
+        assert np.allclose(templated[port_name], expanded[port_name], rtol=0, atol=1e-12), port_name
+    return templated
+
+def test_template_matches_expanded_gates(get_waveforms, spy):
+    stamped = spy(Template, "_get_block")
+    expanded = spy(Template, "_get_pulse_list")
+    executed = spy(Template, "_execute", lambda self, port: port.align_modes[-1][0] != "sequential")
+    compile_both(get_waveforms)
+    assert len(stamped) > 0
+    assert len(expanded) == 0
+    assert len(executed) == 0
+
+def test_template_block_for_each_frequency(get_waveforms):
+    def prepare(cir):
+        with cir.qdetuning(1, 0.013):
+            cir.rx90(1)
+    compile_both(get_waveforms, prepare)
+    template = backend.gate_table.get_template("rx90", 1).instruction_list[0][0]
+    assert isinstance(template, Template)
+    port = backend.port_table.nodes[1].q
+    assert (port.if_freq, port.DAC_STEP) in template.block_dict
+    assert (port.if_freq + 0.013, port.DAC_STEP) in template.block_dict
+
+@pytest.mark.parametrize("delay", [0.3, 10.5])
+def test_template_misaligned_falls_back(get_waveforms, spy, delay):
+    expanded = spy(Template, "_get_pulse_list")
+    # the gates on the qubit 1 start off the sample grid
+    compile_both(get_waveforms, lambda cir: cir.qdelay(delay, 1))
+    assert len(expanded) > 0
+
+def test_template_under_non_sequential_align(get_waveforms, spy):
+    expanded = spy(Template, "_execute", lambda self, port: port.align_modes[-1][0] != "sequential")
+    def prepare(cir):
+        port = cir._verify_port(backend.port_table.nodes[2].q)
+        with cir.align(port, "left"):
+            cir.rx90(2)
+            cir.rx90(2)
+    compile_both(get_waveforms, prepare)
+    # the instructions of the template are executed one by one
+    assert len(expanded) > 0
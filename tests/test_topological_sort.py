@@ -0,0 +1,79 @@
+import random
+import pytest
+from sequence_parser.util.topological_sort import topological_sort, weighted_topological_sort
+
+def previous_weighted_topological_sort(node_list, weighted_edge_list):
+    """Scheduler replaced by the longest-path pass, kept as the reference"""
+    nx = pytest.importorskip("networkx")
+    weighted_edge_list = weighted_edge_list[:]
+    graph = nx.DiGraph()
+    graph.add_nodes_from(node_list)
+    graph.add_edges_from([(fnode, bnode) for fnode, bnode, weight in weighted_edge_list])
+    sorted_node_list = list(nx.topological_sort(graph))
+
+    node_pos = [None]*len(node_list)
+    head_node_list = [sorted_node_list[0]]
+    node_pos[sorted_node_list[0]] = 0
+    while len(head_node_list) >0:
+        head_node = head_node_list.pop(0)
+        head_pos = node_pos[head_node]
+        next_head_node_list = []
+        for fnode, bnode, weight in weighted_edge_list[:]:
+            if fnode == head_node:
+                next_head_node_list.append(bnode)
+                if node_pos[bnode] is None:
+                    node_pos[bnode] = head_pos + weight
+                else:
+                    node_pos[bnode] = max(head_pos + weight, node_pos[bnode])
+                weighted_edge_list.remove((fnode, bnode, weight))
+
+        for next_head_node in next_head_node_list:
+            flag = True
+            for fnode, bnode, weight in weighted_edge_list:
+                if bnode == next_head_node:
+                    flag = False
+            if flag:
+                if next_head_node not in head_node_list:
+                    head_node_list.append(next_head_node)
+        head_node_list.sort(key=sorted_node_list.index)
+
+    return node_pos
+
+def build_trigger_graph(n_triggers, n_ports=6, ports_per_trigger=2, seed=0):
+    """Graph of the ports chaining their triggers, each trigger shared by a few randomly chosen ports"""
+    rng = random.Random(seed)
+    last_trigger = [0]*n_ports
+    weighted_edge_dict = {}
+    for trigger_index in range(1, n_triggers):
+        for port_index in rng.sample(range(n_ports), ports_per_trigger):
+            key = (last_trigger[port_index], trigger_index)
+            weighted_edge_dict[key] = max(weighted_edge_dict.get(key, 0), rng.uniform(10, 100))
+            last_trigger[port_index] = trigger_index
+    return list(range(n_triggers)), [(fnode, bnode, weight) for (fnode, bnode), weight in weighted_edge_dict.items()]
+
+def test_weighted_topological_sort_small_graph():
+    node_list = [0, 1, 2, 3, 4]
+    weighted_edge_list = [(0, 1, 10), (0, 2, 5), (2, 1, 20), (1, 3, 7), (2, 3, 1)]
+    # the trigger 4 is not reached from the first trigger
+    assert weighted_topological_sort(node_list, weighted_edge_list) == [0, 25, 5, 32, None]
+    assert weighted_topological_sort(node_list, weighted_edge_list) == previous_weighted_topological_sort(node_list, weighted_edge_list)
+
+@pytest.mark.parametrize("seed", range(5))
+def test_weighted_topological_sort_matches_previous(seed):
+    node_list, weighted_edge_list = build_trigger_graph(40, seed=seed)
+    assert weighted_topological_sort(node_list, weighted_edge_list) == previous_weighted_topological_sort(node_list, weighted_edge_list)
+
+def test_topological_sort_orders_edges_forward():
+    node_list, weighted_edge_list = build_trigger_graph(40)
+    node_list = node_list[::-1]
+    sorted_node_list = topological_sort(node_list, [(fnode, bnode) for fnode, bnode, _ in weighted_edge_list])
+    order = {node : index for index, node in enumerate(sorted_node_list)}
+    assert sorted(sorted_node_list) == sorted(node_list)
+    assert all(order[fnode] < order[bnode] for fnode, bnode, _ in weighted_edge_list)
+
+def test_cycle_raises_with_trigger_names():
+    node_list = [0, 1, 2, 3, 4]
+    # the triggers 1, 2 and 3 form a cycle followed by the trigger 4
+    weighted_edge_list = [(0, 1, 10), (1, 2, 10), (2, 3, 10), (3, 1, 10), (3, 4, 10)]
+    with pytest.raises(Exception, match=r"triggers \[1, 2, 3\] form a cycle"):
+        weighted_topological_sort(node_list, weighted_edge_list)
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+from sequence_parser.sequence import Sequence
+from sequence_parser.port import Port
+from sequence_parser.variable import Variable, Variables, Expression
+from sequence_parser.instruction import Gaussian
+
+def build_variables():
+    amplitude = Variable("amplitude", [0.1, 0.2, 0.4], "")
+    scale = Variable("scale", [1, 2], "")
+    phase = Variable("phase", [0, np.pi/2, np.pi], "rad")
+    variables = Variables()
+    variables.add(amplitude)
+    variables.add([scale, Variable("offset", [0.01, 0.02], "")])
+    variables.add(phase)
+    variables.compile()
+    return variables, amplitude, scale, phase
+
+def test_expression_is_evaluated_at_each_sweep_point():
+    variables, amplitude, scale, phase = build_variables()
+    offset = variables.variable_list[1][1]
+    expression = np.exp(1j*phase)*(amplitude*scale + offset) - 2/scale
+    assert [variable.name for variable in expression.variables] == ["phase", "amplitude", "scale", "offset"]
+    source_list = [amplitude, scale, offset, phase]
+    for index in range(len(variables)):
+        for name, idx in variables[index].items():
+            [variable for variable in source_list if variable.name == name][0]._set_value(idx)
+        reference = np.exp(1j*phase.value)*(amplitude.value*scale.value + offset.value) - 2/scale.value
+        assert np.isclose(expression.value, reference)
+
+def test_expression_in_sequence():
+    variables, amplitude, scale, phase = build_variables()
+    seq = Sequence()
+    seq.add(Gaussian(amplitude=amplitude*scale, fwhm=10, duration=40), Port("Q0"))
+    assert sorted(seq.variable_dict) == ["amplitude", "scale"]
+    for position, update_command in enumerate(variables.update_command_list):
+        seq.update_variables({name : index for name, index in update_command.items() if name in seq.variable_dict})
+        seq.compile()
+        # the sequence holds copies of the variables
+        nd_index = variables.get_sweep_index(position)
+        reference = amplitude.value_array[nd_index[0]]*scale.value_array[nd_index[1]]
+        assert np.isclose(np.abs(seq.port_list[0].waveform).max(), reference)
+
+def test_expression_of_expression_shares_source_variables():
+    amplitude = Variable("amplitude", [0.1, 0.2], "")
+    expression = (amplitude + 1)*(amplitude - 1)
+    assert expression.variables == [amplitude]
+    amplitude._set_value(1)
+    assert np.isclose(expression.value, 0.2**2 - 1)
+
+def test_expression_cannot_be_swept_or_set():
+    expression = 2*Variable("amplitude", [0.1, 0.2], "")
+    assert isinstance(expression, Expression)
+    with pytest.raises(Exception):
+        Variables().add(expression)
+    with pytest.raises(Exception):
+        expression._set_value(0)
+
+def test_variable_comparison_is_not_an_expression():
+    amplitude = Variable("amplitude", [0.1, 0.2], "")
+    assert (np.float64(0.1) == amplitude) is False
+    assert (np.float64(0.1) != amplitude) is True
+    assert np.equal(amplitude, amplitude) is True
+    assert amplitude in [np.float64(0.1), amplitude]
+    with pytest.raises(TypeError):
+        np.float64(0.1) < amplitude
+    with pytest.raises(TypeError):
+        np.isnan(amplitude)
+
+def build_grid(order, outer=None, shape=(3, 4, 2)):
+    variables = Variables()
+    for axis, size in enumerate(shape):
+        variables.add(Variable(f"x{axis}", np.arange(size)*1.5, ""))
+    variables.compile(order, outer)
+    return variables
+
+ORDER_LIST = [("raster", None), ("raster", ["x2"]), ("snake", None), ("snake", ["x2", "x0"]), ("gray", None), ("gray", ["x1"])]
+
+@pytest.mark.parametrize("order, outer", ORDER_LIST)
+def test_sweep_visits_every_point_once(order, outer):
+    variables = build_grid(order, outer)
+    permutation = variables.get_permutation()
+    assert sorted(permutation.tolist()) == list(range(len(variables)))
+    nd_index_list = [variables.get_sweep_index(position) for position in range(len(variables))]
+    assert [np.ravel_multi_index(nd_index, variables.shape) for nd_index in nd_index_list] == permutation.tolist()
+    assert np.array_equal(variables.to_canonical_order(permutation), np.arange(len(variables)))
+    assert variables.to_canonical_order(permutation.tolist()) == list(range(len(variables)))
+
+@pytest.mark.parametrize("order, outer, shape", [
+    ("snake", None, (3, 4)),
+    ("snake", ["x1"], (3, 4)),
+    ("gray", None, (3, 4, 2)),
+    ("gray", ["x2", "x1"], (3, 4, 2)),
+])
+def test_sweep_moves_one_axis_by_one_step(order, outer, shape):
+    variables = build_grid(order, outer, shape)
+    nd_index_list = np.array([variables.get_sweep_index(position) for position in range(len(variables))])
+    step = np.abs(np.diff(nd_index_list, axis=0))
+    assert np.all(step.sum(axis=1) == 1)
+
+@pytest.mark.parametrize("order, outer", ORDER_LIST)
+def test_update_commands_reach_each_point(order, outer):
+    variables = build_grid(order, outer)
+    update_command_list = variables.update_command_list
+    assert len(update_command_list) == len(variables)
+    assert list(update_command_list) == update_command_list[:]
+    assert update_command_list[-1] == update_command_list[len(variables) - 1]
+    current = {}
+    for position, update_command in enumerate(update_command_list):
+        if position > 0:
+            # only the variables whose values change are updated
+            assert all(current[name] != index for name, index in update_command.items())
+        current.update(update_command)
+        assert current == variables[variables.get_sweep_index(position)]
+    with pytest.raises(IndexError):
+        update_command_list[len(variables)]
+
+def test_update_commands_are_evaluated_lazily():
+    # a grid of 10**9 points is compiled without evaluating the update commands
+    variables = build_grid("gray", ["x1"], shape=(1000, 1000, 1000))
+    update_command_list = variables.update_command_list
+    assert len(update_command_list) == 10**9
+    # x1 ends at its last value outermost, and x0 and x2 end where they started since their sizes are even
+    assert variables.get_sweep_index(-1) == (0, 999, 0)
+    assert update_command_list[-1] == {"x2" : 0}